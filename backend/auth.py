@@ -4,14 +4,19 @@ Handles Sign in with Apple verification and JWT token management
 """
 
 import os
-from datetime import datetime, timedelta
-from typing import Optional
+import time
+import asyncio
+import base64
+import hashlib
+import hmac
+from typing import Optional, Dict, Any
 import httpx
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError, jwk
 from jose.utils import base64url_decode
 import json
+import orjson
 
 security = HTTPBearer()
 
@@ -21,35 +26,72 @@ JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_DAYS = 30
 APPLE_CLIENT_ID = os.getenv("APPLE_CLIENT_ID", "com.furg.app")
 
-# Apple's public keys cache
-_apple_keys_cache = None
-_keys_cache_time = None
-KEYS_CACHE_DURATION = 3600  # 1 hour
 
+def _b64url(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
 
-async def get_apple_public_keys():
-    """Fetch and cache Apple's public keys for token verification"""
+
+# HS256 signing state built once at import: the encoded header never
+# changes, so the HMAC is keyed and fed "<header>." up front and each
+# token only copies it and hashes its payload.
+_JWT_HEADER_B64 = _b64url(b'{"alg":"HS256","typ":"JWT"}')
+_JWT_SIGNER = hmac.new(JWT_SECRET.encode(), _JWT_HEADER_B64 + b".", hashlib.sha256)
+
+# Read once at import; the debug flag can't change while the process runs
+_DEBUG_MODE = os.getenv("DEBUG", "false").lower() == "true"
+
+# Apple's public keys cache (kid -> constructed public key)
+# Apple rotates keys rarely; a token signed with an unknown kid triggers an
+# early refresh, at most once per KEYS_REFRESH_MIN_INTERVAL.
+_apple_keys_cache: Dict[str, Any] = {}
+_keys_cache_time = 0.0
+_keys_lock = asyncio.Lock()
+KEYS_CACHE_DURATION = 86400  # 24 hours
+KEYS_REFRESH_MIN_INTERVAL = 60  # seconds
+
+
+def _keys_cache_fresh(force: bool = False) -> bool:
+    age = time.monotonic() - _keys_cache_time
+    if force:
+        return age < KEYS_REFRESH_MIN_INTERVAL
+    return bool(_apple_keys_cache) and age < KEYS_CACHE_DURATION
+
+
+async def get_apple_public_keys(force: bool = False) -> Dict[str, Any]:
+    """
+    Fetch and cache Apple's public keys for token verification
+
+    Args:
+        force: Refetch even if the cache hasn't expired (unknown kid)
+    """
     global _apple_keys_cache, _keys_cache_time
 
     # Check cache
-    if _apple_keys_cache and _keys_cache_time:
-        if (datetime.utcnow() - _keys_cache_time).total_seconds() < KEYS_CACHE_DURATION:
-            return _apple_keys_cache
+    if _keys_cache_fresh(force):
+        return _apple_keys_cache
 
-    # Fetch new keys
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get("https://appleid.apple.com/auth/keys")
-            response.raise_for_status()
-            keys_data = response.json()
-            _apple_keys_cache = keys_data["keys"]
-            _keys_cache_time = datetime.utcnow()
+    # Only one coroutine refreshes; the rest wait and reuse its result
+    async with _keys_lock:
+        if _keys_cache_fresh(force):
             return _apple_keys_cache
-        except Exception as e:
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail=f"Failed to fetch Apple public keys: {str(e)}"
-            )
+
+        async with httpx.AsyncClient() as client:
+            try:
+                response = await client.get("https://appleid.apple.com/auth/keys")
+                response.raise_for_status()
+                keys_data = response.json()
+                _apple_keys_cache = {
+                    key["kid"]: jwk.construct(key)
+                    for key in keys_data["keys"]
+                    if key.get("kid")
+                }
+                _keys_cache_time = time.monotonic()
+                return _apple_keys_cache
+            except Exception as e:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail=f"Failed to fetch Apple public keys: {str(e)}"
+                )
 
 
 async def verify_apple_token(token: str) -> dict:
@@ -79,22 +121,18 @@ async def verify_apple_token(token: str) -> dict:
         # Get Apple's public keys
         apple_keys = await get_apple_public_keys()
 
-        # Find the key matching the token's kid
-        public_key = None
-        for key in apple_keys:
-            if key.get("kid") == kid:
-                public_key = key
-                break
+        # Find the key matching the token's kid (refetch once if Apple rotated keys)
+        rsa_key = apple_keys.get(kid)
+        if rsa_key is None:
+            apple_keys = await get_apple_public_keys(force=True)
+            rsa_key = apple_keys.get(kid)
 
-        if not public_key:
+        if rsa_key is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid Apple token: key not found"
             )
 
-        # Construct the public key
-        rsa_key = jwk.construct(public_key)
-
         # Decode and verify the token
         decoded = jwt.decode(
             token,
@@ -106,7 +144,7 @@ async def verify_apple_token(token: str) -> dict:
 
         # Verify expiration
         exp = decoded.get("exp")
-        if exp and datetime.utcnow().timestamp() > exp:
+        if exp and time.time() > exp:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Apple token expired"
@@ -141,20 +179,24 @@ def create_jwt_token(user_id: str, additional_claims: Optional[dict] = None) ->
     Returns:
         JWT token string
     """
-    expiration = datetime.utcnow() + timedelta(days=JWT_EXPIRATION_DAYS)
+    issued_at = int(time.time())
 
     payload = {
         "user_id": user_id,
-        "exp": expiration,
-        "iat": datetime.utcnow(),
+        "exp": issued_at + JWT_EXPIRATION_DAYS * 86400,
+        "iat": issued_at,
         "type": "access"
     }
 
     if additional_claims:
         payload.update(additional_claims)
 
-    token = jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
-    return token
+    payload_b64 = _b64url(orjson.dumps(payload))
+    signer = _JWT_SIGNER.copy()
+    signer.update(payload_b64)
+
+    token = _JWT_HEADER_B64 + b"." + payload_b64 + b"." + _b64url(signer.digest())
+    return token.decode()
 
 
 async def get_current_user(
@@ -192,7 +234,7 @@ async def get_current_user(
 
         # Check expiration (jose already validates exp, but double-check)
         exp = payload.get("exp")
-        if exp and datetime.utcnow().timestamp() > exp:
+        if exp and time.time() > exp:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Token expired"
@@ -266,7 +308,7 @@ def get_user_from_token(token: str) -> Optional[str]:
 
 def create_test_token(user_id: str = "test-user-123") -> str:
     """Create a test token for development (DO NOT use in production)"""
-    if os.getenv("DEBUG", "false").lower() != "true":
+    if not _DEBUG_MODE:
         raise RuntimeError("Test tokens only available in debug mode")
 
     return create_jwt_token(user_id)
@@ -277,7 +319,7 @@ async def verify_test_apple_token(token: str) -> dict:
     Mock Apple token verification for testing
     Only active when DEBUG=true
     """
-    if os.getenv("DEBUG", "false").lower() != "true":
+    if not _DEBUG_MODE:
         raise RuntimeError("Test verification only available in debug mode")
 
     # In test mode, accept tokens in format "test_apple_<user_id>"
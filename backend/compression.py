@@ -0,0 +1,40 @@
+"""
+Response compression for FURG
+GZip for buffered responses; streamed responses are passed through untouched
+"""
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+
+# Written line by line as they are generated; gzip would hold lines back
+# until its compressor flushes, so these are never compressed
+STREAMING_MEDIA_TYPES = ("application/x-ndjson", "text/event-stream")
+
+
+class _BufferedGZipResponder(GZipResponder):
+    """GZipResponder that sends streaming media types as they are written"""
+
+    async def send_with_gzip(self, message) -> None:
+        await super().send_with_gzip(message)
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            if content_type.startswith(STREAMING_MEDIA_TYPES):
+                # Take the pass-through path GZipResponder uses for already-encoded bodies
+                self.content_encoding_set = True
+
+
+class BufferedGZipMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware that leaves streaming responses uncompressed
+
+    Large JSON lists still shrink for mobile clients, while NDJSON and SSE
+    streams reach the client line by line instead of in compressor-sized
+    bursts.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("accept-encoding", ""):
+            responder = _BufferedGZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
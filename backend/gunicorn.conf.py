@@ -0,0 +1,20 @@
+"""
+Gunicorn configuration for FURG
+Runs the FastAPI app across multiple Uvicorn worker processes
+"""
+
+import os
+import multiprocessing
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# 2 * cores + 1 so CPU-bound requests on one worker don't stall the others
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "uvicorn_worker.FurgUvicornWorker"  # uvloop + httptools
+worker_connections = 1000
+keepalive = 5
+
+# Import the app once in the master, then fork
+preload_app = True
+
+loglevel = os.getenv("LOG_LEVEL", "info")
@@ -4,14 +4,25 @@ Main FastAPI application
 """
 
 import os
-from datetime import datetime, timedelta
+import queue
+import shutil
+import asyncio
+import bisect
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from datetime import datetime, timedelta, timezone
+from types import MappingProxyType
 from typing import Optional, Dict, Any
+from collections import defaultdict
 from contextlib import asynccontextmanager
+from functools import lru_cache
 
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, APIRouter, Depends, Header, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, ConfigDict
+import numpy as np
+import orjson
 
 from auth import (
     verify_apple_token,
@@ -20,7 +31,16 @@ from auth import (
     get_current_user
 )
 from database import db
-from rate_limiter import rate_limit, get_remaining_budget
+from rate_limiter import (
+    rate_limit,
+    get_remaining_budget,
+    start_usage_flusher,
+    stop_usage_flusher,
+    start_request_window_gc,
+    stop_request_window_gc,
+)
+from redis_client import connect_redis, close_redis
+from compression import BufferedGZipMiddleware
 from services.chat import ChatService  # Legacy single-model service
 from services.chat_v2 import ChatServiceV2  # Multi-model service
 from services.plaid_service import PlaidService
@@ -29,39 +49,70 @@ from services.shadow_banking import ShadowBankingService
 from services.gemini_service import gemini_service
 from services.grok_service import grok_service
 from services.openai_shopping import ShoppingAssistant, quick_shop
-from services.deals_service import DealsService, PriceTracker
+from services.deals_service import DealsService, DealsPriceTracker as PriceTracker
+from services.keywords import keyword_pattern
+from services.response_cache import response_cache, cached_response
+from services.context_cache import context_cache
 from ml.categorizer import get_categorizer
 
 # Feature flag for multi-model chat
 USE_MULTI_MODEL_CHAT = os.getenv("USE_MULTI_MODEL_CHAT", "true").lower() == "true"
 
+# Debug mode is fixed for the life of the process
+_DEBUG_MODE = os.getenv("DEBUG", "false").lower() == "true"
+
+# Logging: the event loop only enqueues records; a listener thread (started
+# per worker in lifespan) does the blocking stdout writes
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_log_listener = QueueListener(_log_queue, logging.StreamHandler())
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "info").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    handlers=[QueueHandler(_log_queue)]
+)
+logger = logging.getLogger("furg")
+
 
 # Lifespan context manager for startup/shutdown
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    print("🚀 Starting FURG backend...")
+    _log_listener.start()
+    logger.info("🚀 Starting FURG backend...")
     await db.connect()
-    print("✅ Database connected")
+    logger.info("✅ Database connected")
+
+    await PlaidService.initialize()
+    await response_cache.connect()
+    await connect_redis()
+    start_usage_flusher()
+    start_request_window_gc()
 
     # Initialize multi-model chat if enabled
     if USE_MULTI_MODEL_CHAT:
-        print("🤖 Initializing multi-model chat (Grok + Claude + Gemini)...")
+        logger.info("🤖 Initializing multi-model chat (Grok + Claude + Gemini)...")
         await ChatServiceV2.initialize()
-        print("✅ Multi-model router ready")
-        print("   - Grok 4 Fast: Roasting & casual chat")
-        print("   - Claude Sonnet: Financial advice")
-        print("   - Gemini Flash: Routing & categorization")
+        logger.info("✅ Multi-model router ready")
+        logger.info("   - Grok 4 Fast: Roasting & casual chat")
+        logger.info("   - Claude Sonnet: Financial advice")
+        logger.info("   - Gemini Flash: Routing & categorization")
     else:
-        print("📝 Using single-model chat (Claude only)")
+        logger.info("📝 Using single-model chat (Claude only)")
 
     yield
 
     # Shutdown
-    print("👋 Shutting down FURG backend...")
+    logger.info("👋 Shutting down FURG backend...")
     await gemini_service.close()
     await grok_service.close()
+    await PlaidService.close()
+    await ChatService.close()
+    await ChatServiceV2.close()
+    await stop_request_window_gc()
+    await stop_usage_flusher()
+    await close_redis()
     await db.disconnect()
+    _log_listener.stop()
 
 
 # Initialize FastAPI app
@@ -69,21 +120,70 @@ app = FastAPI(
     title="FURG API",
     description="Chat-First Financial AI with Roasting Personality",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
-# CORS middleware
+# CORS middleware (explicit allow-list; preflights cached for a day)
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("CORS_ORIGINS", "https://app.furg.app").split(",")
+    if origin.strip()
+]
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Configure properly for production
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "PATCH", "DELETE"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=86400,
 )
 
+# Compress larger JSON payloads (transactions, history, spending) for mobile clients
+# (NDJSON streams are sent uncompressed so each line reaches the client as written)
+app.add_middleware(BufferedGZipMiddleware, minimum_size=1024, compresslevel=5)
+
+
+async def _now_dep() -> datetime:
+    """
+    Read the clock once per request
+
+    Returns naive UTC to match the TIMESTAMP (without time zone) columns.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _wants_ndjson(accept: Optional[str]) -> bool:
+    """Clients opt in to row-by-row streaming with Accept: application/x-ndjson"""
+    return bool(accept) and NDJSON_MEDIA_TYPE in accept
+
+
+# ==================== ROUTERS ====================
+# Authenticated routers resolve get_current_user once at router level;
+# handlers that also declare it reuse the cached result.
+
+_auth_required = [Depends(get_current_user)]
+
+auth_router = APIRouter(prefix="/api/v1/auth", tags=["auth"])
+chat_router = APIRouter(prefix="/api/v1/chat", tags=["chat"], dependencies=_auth_required)
+plaid_router = APIRouter(prefix="/api/v1/plaid", tags=["plaid"], dependencies=_auth_required)
+transactions_router = APIRouter(prefix="/api/v1/transactions", tags=["transactions"], dependencies=_auth_required)
+bills_router = APIRouter(prefix="/api/v1/bills", tags=["bills"], dependencies=_auth_required)
+money_router = APIRouter(prefix="/api/v1", tags=["money"], dependencies=_auth_required)
+profile_router = APIRouter(prefix="/api/v1/profile", tags=["profile"], dependencies=_auth_required)
+usage_router = APIRouter(prefix="/api/v1/usage", tags=["usage"], dependencies=_auth_required)
+
 
 # ==================== REQUEST/RESPONSE MODELS ====================
 
+# Request bodies are read-only once validated; unknown fields are dropped
+# rather than rejected so older and newer app builds keep working
+_REQUEST_MODEL_CONFIG = ConfigDict(frozen=True, extra="ignore")
+
 class AppleAuthRequest(BaseModel):
     apple_token: str
     user_identifier: Optional[str] = None
@@ -153,21 +253,29 @@ class SubscriptionAction(BaseModel):
     action: str  # "cancel", "pause", "negotiate"
 
 
+# ==================== STATIC RESPONSE BODIES ====================
+# Constant payloads serialized once at import
+
+_ROOT_BYTES = orjson.dumps({
+    "app": "FURG",
+    "tagline": "Your money, but smarter than you",
+    "version": "1.0.0",
+    "docs": "/docs"
+})
+_HISTORY_CLEARED_BYTES = orjson.dumps({"message": "Conversation history cleared"})
+_BANK_REMOVED_BYTES = orjson.dumps({"message": "Bank removed successfully"})
+
+
 # ==================== HEALTH & INFO ENDPOINTS ====================
 
 @app.get("/")
 async def root():
     """Root endpoint"""
-    return {
-        "app": "FURG",
-        "tagline": "Your money, but smarter than you",
-        "version": "1.0.0",
-        "docs": "/docs"
-    }
+    return Response(content=_ROOT_BYTES, media_type="application/json")
 
 
 @app.get("/health")
-async def health():
+async def health(now: datetime = Depends(_now_dep)):
     """Health check endpoint"""
     try:
         # Test database connection
@@ -177,10 +285,10 @@ async def health():
         return {
             "status": "healthy",
             "database": "connected",
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": now.isoformat()
         }
     except Exception as e:
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=503,
             content={
                 "status": "unhealthy",
@@ -191,7 +299,7 @@ async def health():
 
 # ==================== AUTHENTICATION ENDPOINTS ====================
 
-@app.post("/api/v1/auth/apple", response_model=AppleAuthResponse)
+@auth_router.post("/apple", responses={200: {"model": AppleAuthResponse}})
 async def authenticate_with_apple(request: AppleAuthRequest):
     """
     Authenticate user with Sign in with Apple
@@ -199,7 +307,7 @@ async def authenticate_with_apple(request: AppleAuthRequest):
     Exchange Apple ID token for JWT
     """
     # Verify Apple token (use test verification in debug mode)
-    if os.getenv("DEBUG", "false").lower() == "true":
+    if _DEBUG_MODE:
         apple_data = await verify_test_apple_token(request.apple_token)
     else:
         apple_data = await verify_apple_token(request.apple_token)
@@ -209,21 +317,18 @@ async def authenticate_with_apple(request: AppleAuthRequest):
 
     # Get or create user
     user = await db.get_or_create_user(apple_user_id, email)
-    is_new_user = user.get("created_at") and (
-        datetime.utcnow() - user["created_at"]
-    ).total_seconds() < 60  # Created in last minute
 
     # Generate JWT
     jwt_token = create_jwt_token(str(user["id"]))
 
-    return AppleAuthResponse(
-        jwt=jwt_token,
-        user_id=str(user["id"]),
-        is_new_user=is_new_user
-    )
+    return ORJSONResponse({
+        "jwt": jwt_token,
+        "user_id": str(user["id"]),
+        "is_new_user": user["is_new"]
+    })
 
 
-@app.get("/api/v1/auth/me")
+@auth_router.get("/me")
 async def get_current_user_info(user_id: str = Depends(get_current_user)):
     """Get current authenticated user info"""
     user = await db.get_user(user_id)
@@ -242,9 +347,14 @@ async def get_current_user_info(user_id: str = Depends(get_current_user)):
 
 # ==================== CHAT ENDPOINTS ====================
 
-@app.post("/api/v1/chat", response_model=ChatResponse)
+@chat_router.post("", responses={200: {"model": ChatResponse}})
 @rate_limit
-async def chat(request: ChatRequest, user_id: str = Depends(get_current_user)):
+async def chat(
+    request: ChatRequest,
+    user_id: str = Depends(get_current_user),
+    now: datetime = Depends(_now_dep),
+    accept: Optional[str] = Header(None)
+):
     """
     Send a message to FURG and get a response
 
@@ -252,14 +362,35 @@ async def chat(request: ChatRequest, user_id: str = Depends(get_current_user)):
     - Roasting/casual -> Grok 4 Fast (cheap, fast)
     - Financial advice -> Claude Sonnet (nuanced)
     - Categorization -> Gemini Flash (fast)
+
+    Legacy Claude chat streams the reply as NDJSON ({"delta": ...} lines,
+    then the full response) if requested.
     """
-    # Get user profile
-    profile = await db.get_user_profile(user_id)
+    # Commands (intensity mode, emergency buffer) never reach a model, so
+    # answer them before loading the profile and building context
+    command_service = ChatServiceV2 if USE_MULTI_MODEL_CHAT else ChatService
+    command_response = await command_service.handle_command(user_id, request.message)
+    if command_response:
+        await db.save_messages(user_id, [
+            ("user", request.message),
+            ("assistant", command_response)
+        ])
+        return ORJSONResponse({
+            "message": command_response,
+            "tokens_used": {"input": 0, "output": 0, "cached": 0} if USE_MULTI_MODEL_CHAT else None,
+            "model": "command" if USE_MULTI_MODEL_CHAT else None,
+            "intent": "command" if USE_MULTI_MODEL_CHAT else None,
+            "cost": 0 if USE_MULTI_MODEL_CHAT else None,
+            "latency_ms": None
+        })
+
+    # Get user profile (cached; invalidated on every profile update)
+    profile = await db.get_user_profile_cached(user_id)
 
     # Build context if requested
     context = None
     if request.include_context:
-        context = await _build_chat_context(user_id)
+        context = await _build_chat_context(user_id, now)
 
     # Use multi-model or legacy single-model chat
     if USE_MULTI_MODEL_CHAT:
@@ -272,59 +403,85 @@ async def chat(request: ChatRequest, user_id: str = Depends(get_current_user)):
             life_context=None  # TODO: Wire up iOS life context
         )
 
-        return ChatResponse(
-            message=response["message"],
-            tokens_used=response.get("tokens_used"),
-            model=response.get("model"),
-            intent=response.get("intent"),
-            cost=response.get("cost"),
-            latency_ms=response.get("latency_ms")
-        )
+        return ORJSONResponse({
+            "message": response["message"],
+            "tokens_used": response.get("tokens_used"),
+            "model": response.get("model"),
+            "intent": response.get("intent"),
+            "cost": response.get("cost"),
+            "latency_ms": response.get("latency_ms")
+        })
+    elif _wants_ndjson(accept):
+        # Legacy single-model chat, streamed as it is generated
+        async def stream_chat():
+            async for chunk in ChatService.chat_stream(user_id, request.message, profile, context):
+                if "delta" not in chunk:
+                    chunk = {
+                        "message": chunk["message"],
+                        "tokens_used": chunk.get("tokens_used"),
+                        "model": "claude-sonnet-4-20250514",
+                        "intent": None,
+                        "cost": None,
+                        "latency_ms": None
+                    }
+                yield orjson.dumps(chunk) + b"\n"
+
+        return StreamingResponse(stream_chat(), media_type=NDJSON_MEDIA_TYPE)
     else:
         # Legacy single-model chat (Claude only)
-        command_response = await ChatService.handle_command(user_id, request.message)
-        if command_response:
-            await db.save_message(user_id, "user", request.message)
-            await db.save_message(user_id, "assistant", command_response)
-            return ChatResponse(message=command_response)
-
         response = await ChatService.chat(user_id, request.message, profile, context)
 
-        return ChatResponse(
-            message=response["message"],
-            tokens_used=response.get("tokens_used"),
-            model="claude-sonnet-4-20250514"
-        )
+        return ORJSONResponse({
+            "message": response["message"],
+            "tokens_used": response.get("tokens_used"),
+            "model": "claude-sonnet-4-20250514",
+            "intent": None,
+            "cost": None,
+            "latency_ms": None
+        })
 
 
-@app.get("/api/v1/chat/history")
+@chat_router.get("/history")
 async def get_chat_history(
     limit: int = 50,
-    user_id: str = Depends(get_current_user)
+    user_id: str = Depends(get_current_user),
+    accept: Optional[str] = Header(None)
 ):
-    """Get conversation history"""
+    """Get conversation history (as NDJSON, one message per line, if requested)"""
+    if _wants_ndjson(accept):
+        async def stream_messages():
+            async for msg in db.iter_conversation_history(user_id, limit):
+                yield orjson.dumps({
+                    "role": msg["role"],
+                    "content": msg["content"],
+                    "timestamp": msg["created_at"]
+                }) + b"\n"
+
+        return StreamingResponse(stream_messages(), media_type=NDJSON_MEDIA_TYPE)
+
     history = await db.get_conversation_history(user_id, limit)
 
-    return {
+    # Built from native types only, so skip jsonable_encoder and hand it to orjson
+    return ORJSONResponse({
         "messages": [
             {
                 "role": msg["role"],
                 "content": msg["content"],
-                "timestamp": msg["created_at"].isoformat()
+                "timestamp": msg["created_at"]
             }
             for msg in history
         ]
-    }
+    })
 
 
-@app.delete("/api/v1/chat/history")
+@chat_router.delete("/history")
 async def clear_chat_history(user_id: str = Depends(get_current_user)):
     """Clear conversation history"""
     await db.clear_conversation_history(user_id)
-    return {"message": "Conversation history cleared"}
+    return Response(content=_HISTORY_CLEARED_BYTES, media_type="application/json")
 
 
-@app.get("/api/v1/chat/routing-stats")
+@chat_router.get("/routing-stats")
 async def get_routing_stats(user_id: str = Depends(get_current_user)):
     """
     Get model routing statistics
@@ -364,41 +521,49 @@ async def get_routing_stats(user_id: str = Depends(get_current_user)):
 
 # ==================== PLAID ENDPOINTS ====================
 
-@app.post("/api/v1/plaid/link-token", response_model=PlaidLinkTokenResponse)
+@plaid_router.post("/link-token", responses={200: {"model": PlaidLinkTokenResponse}})
 async def create_plaid_link_token(user_id: str = Depends(get_current_user)):
     """Create Plaid Link token for connecting banks"""
     link_token = await PlaidService.create_link_token(user_id)
-    return PlaidLinkTokenResponse(link_token=link_token)
+    return ORJSONResponse({"link_token": link_token})
 
 
-@app.post("/api/v1/plaid/exchange")
+@plaid_router.post("/exchange")
 async def exchange_plaid_token(
     request: PlaidExchangeRequest,
     user_id: str = Depends(get_current_user)
 ):
     """Exchange public token for access token after bank connection"""
     result = await PlaidService.exchange_public_token(user_id, request.public_token)
+    # The new bank's accounts count toward the balance from now on
+    await response_cache.invalidate(user_id, "balance", "forecast")
     return result
 
 
-@app.post("/api/v1/plaid/sync/{item_id}")
+@plaid_router.post("/sync/{item_id}")
 async def sync_plaid_transactions(
     item_id: str,
     user_id: str = Depends(get_current_user)
 ):
     """Sync transactions for a connected bank"""
     result = await PlaidService.sync_transactions(user_id, item_id)
+    await response_cache.invalidate(
+        user_id, "balance", "bills", "spending", "subscriptions", "forecast", "bill_detection", "safety"
+    )
     return result
 
 
-@app.post("/api/v1/plaid/sync-all")
+@plaid_router.post("/sync-all")
 async def sync_all_plaid_transactions(user_id: str = Depends(get_current_user)):
     """Sync transactions from all connected banks"""
     result = await PlaidService.sync_all_banks(user_id)
+    await response_cache.invalidate(
+        user_id, "balance", "bills", "spending", "subscriptions", "forecast", "bill_detection", "safety"
+    )
     return result
 
 
-@app.get("/api/v1/plaid/accounts/{item_id}")
+@plaid_router.get("/accounts/{item_id}")
 async def get_plaid_accounts(
     item_id: str,
     user_id: str = Depends(get_current_user)
@@ -408,58 +573,87 @@ async def get_plaid_accounts(
     return {"accounts": accounts}
 
 
-@app.delete("/api/v1/plaid/banks/{item_id}")
+@plaid_router.delete("/banks/{item_id}")
 async def remove_plaid_bank(
     item_id: str,
     user_id: str = Depends(get_current_user)
 ):
     """Remove a connected bank"""
     await PlaidService.remove_bank(user_id, item_id)
-    return {"message": "Bank removed successfully"}
+    await response_cache.invalidate(user_id, "balance", "forecast")
+    return Response(content=_BANK_REMOVED_BYTES, media_type="application/json")
 
 
 # ==================== TRANSACTION ENDPOINTS ====================
 
-@app.get("/api/v1/transactions")
+@transactions_router.get("")
 async def get_transactions(
     days: int = 30,
     limit: int = 100,
-    user_id: str = Depends(get_current_user)
+    include_spending: bool = False,
+    user_id: str = Depends(get_current_user),
+    now: datetime = Depends(_now_dep),
+    accept: Optional[str] = Header(None)
 ):
-    """Get transaction history"""
-    start_date = datetime.now() - timedelta(days=days)
-    transactions = await db.get_transactions(
-        user_id=user_id,
-        start_date=start_date,
-        limit=limit
+    """
+    Get transaction history (optionally with the spending summary in the same call)
+
+    Without the spending summary, transactions can be streamed as NDJSON.
+    """
+    start_date = now - timedelta(days=days)
+
+    if not include_spending:
+        if _wants_ndjson(accept):
+            async def stream_transactions():
+                async for txn in db.iter_transactions(user_id, start_date, now, limit):
+                    yield orjson.dumps(dict(txn)) + b"\n"
+
+            return StreamingResponse(stream_transactions(), media_type=NDJSON_MEDIA_TYPE)
+
+        # Rows already match the response shape (casts done in SQL)
+        transactions = await db.get_transaction_feed(user_id, start_date, now, limit)
+        return ORJSONResponse({"transactions": transactions})
+
+    rows, spending = await db.get_transactions_and_spending(
+        user_id, start_date, now, limit=limit
     )
 
-    return {
+    response = {
         "transactions": [
             {
                 "id": str(txn["id"]),
-                "date": txn["date"].isoformat(),
+                "date": txn["date"],
                 "amount": float(txn["amount"]),
                 "merchant": txn["merchant"],
                 "category": txn.get("category"),
                 "is_bill": txn.get("is_bill", False)
             }
-            for txn in transactions
-        ]
+            for txn in rows
+        ],
+        "spending": {
+            "total_spent": round(sum(spending.values()), 2),
+            "by_category": {k: round(v, 2) for k, v in spending.items()},
+            "period_days": days
+        }
     }
 
+    # Built from native types only, so skip jsonable_encoder and hand it to orjson
+    return ORJSONResponse(response)
+
 
-@app.get("/api/v1/transactions/spending")
+@transactions_router.get("/spending")
+@cached_response("spending", ttl=30)
 async def get_spending_summary(
     days: int = 30,
-    user_id: str = Depends(get_current_user)
+    user_id: str = Depends(get_current_user),
+    now: datetime = Depends(_now_dep)
 ):
     """Get spending summary by category"""
-    start_date = datetime.now() - timedelta(days=days)
+    start_date = now - timedelta(days=days)
     spending = await db.get_spending_by_category(
         user_id,
         start_date,
-        datetime.now()
+        now
     )
 
     total = sum(spending.values())
@@ -473,13 +667,14 @@ async def get_spending_summary(
 
 # ==================== BILL ENDPOINTS ====================
 
-@app.post("/api/v1/bills/detect")
+@bills_router.post("/detect")
 async def detect_bills(
     days_lookback: int = 90,
     user_id: str = Depends(get_current_user)
 ):
     """Run bill detection on transaction history"""
     bills = await BillDetector.detect_bills(user_id, days_lookback)
+    await response_cache.invalidate(user_id, "bills", "forecast", "safety")
 
     return {
         "detected": len(bills),
@@ -487,26 +682,16 @@ async def detect_bills(
     }
 
 
-@app.get("/api/v1/bills")
+@bills_router.get("")
+@cached_response("bills", ttl=30)
 async def get_bills(user_id: str = Depends(get_current_user)):
     """Get all active bills"""
-    bills = await db.get_active_bills(user_id)
+    # Rows already match the response shape (casts done in SQL)
+    return {"bills": await db.get_bill_feed(user_id)}
 
-    return {
-        "bills": [
-            {
-                "merchant": bill["merchant"],
-                "amount": float(bill["amount"]),
-                "frequency_days": bill["frequency_days"],
-                "next_due": bill["next_due_date"].isoformat() if hasattr(bill["next_due_date"], "isoformat") else str(bill["next_due_date"]),
-                "confidence": float(bill["confidence"])
-            }
-            for bill in bills
-        ]
-    }
 
-
-@app.get("/api/v1/bills/upcoming")
+@bills_router.get("/upcoming")
+@cached_response("bills", ttl=30)
 async def get_upcoming_bills(
     days: int = 30,
     user_id: str = Depends(get_current_user)
@@ -518,14 +703,15 @@ async def get_upcoming_bills(
 
 # ==================== BALANCE & MONEY ENDPOINTS ====================
 
-@app.get("/api/v1/balance")
+@money_router.get("/balance")
+@cached_response("balance", ttl=10)
 async def get_balance(user_id: str = Depends(get_current_user)):
     """Get balance summary (visible + hidden)"""
     summary = await ShadowBankingService.get_balance_summary(user_id)
     return summary
 
 
-@app.post("/api/v1/money/hide")
+@money_router.post("/money/hide")
 async def hide_money(
     request: HideMoneyRequest,
     user_id: str = Depends(get_current_user)
@@ -536,10 +722,11 @@ async def hide_money(
         request.amount,
         request.purpose
     )
+    await response_cache.invalidate(user_id, "balance", "forecast")
     return result
 
 
-@app.post("/api/v1/money/reveal")
+@money_router.post("/money/reveal")
 async def reveal_money(
     request: RevealMoneyRequest,
     user_id: str = Depends(get_current_user)
@@ -550,10 +737,11 @@ async def reveal_money(
         request.amount,
         request.account_id
     )
+    await response_cache.invalidate(user_id, "balance", "forecast")
     return result
 
 
-@app.post("/api/v1/savings-goal")
+@money_router.post("/savings-goal")
 async def set_savings_goal(
     request: SavingsGoalRequest,
     user_id: str = Depends(get_current_user)
@@ -565,21 +753,22 @@ async def set_savings_goal(
         request.deadline,
         request.frequency
     )
+    await response_cache.invalidate(user_id, "balance", "forecast")
     return result
 
 
 # ==================== PROFILE ENDPOINTS ====================
 
-@app.get("/api/v1/profile")
+@profile_router.get("")
 async def get_profile(user_id: str = Depends(get_current_user)):
     """Get user profile"""
-    profile = await db.get_user_profile(user_id)
+    profile = await db.get_user_profile_cached(user_id)
     if not profile:
         raise HTTPException(404, "Profile not found")
     return profile
 
 
-@app.patch("/api/v1/profile")
+@profile_router.patch("")
 async def update_profile(
     updates: Dict[str, Any],
     user_id: str = Depends(get_current_user)
@@ -589,12 +778,15 @@ async def update_profile(
     if not success:
         raise HTTPException(400, "Failed to update profile")
 
+    await context_cache.invalidate_on_profile_update(user_id)
+    await response_cache.invalidate(user_id, "safety")
+
     return {"message": "Profile updated successfully"}
 
 
 # ==================== USAGE & BUDGET ENDPOINTS ====================
 
-@app.get("/api/v1/usage")
+@usage_router.get("")
 async def get_usage_stats(user_id: str = Depends(get_current_user)):
     """Get API usage and budget stats"""
     budget = await get_remaining_budget(user_id)
@@ -604,6 +796,7 @@ async def get_usage_stats(user_id: str = Depends(get_current_user)):
 # ==================== SUBSCRIPTION ENDPOINTS ====================
 
 @app.get("/api/v1/subscriptions")
+@cached_response("subscriptions", ttl=30)
 async def get_subscriptions(user_id: str = Depends(get_current_user)):
     """Get detected subscriptions"""
     subscriptions = await db.get_subscriptions(user_id)
@@ -618,19 +811,21 @@ async def get_subscriptions(user_id: str = Depends(get_current_user)):
 @app.post("/api/v1/subscriptions/detect")
 async def detect_subscriptions(
     days_lookback: int = 180,
-    user_id: str = Depends(get_current_user)
+    user_id: str = Depends(get_current_user),
+    now: datetime = Depends(_now_dep)
 ):
     """Detect subscriptions from transaction history"""
     # Get transactions
-    start_date = datetime.now() - timedelta(days=days_lookback)
-    transactions = await db.get_transactions(user_id, start_date=start_date, limit=500)
+    start_date = now - timedelta(days=days_lookback)
+    transactions = await db.get_transactions(user_id, start_date=start_date, end_date=now, limit=500)
 
     # Detect recurring patterns
-    subscriptions = await _detect_subscription_patterns(transactions)
+    subscriptions = _detect_subscription_patterns(transactions)
 
     # Save to database
     for sub in subscriptions:
         await db.save_subscription(user_id, sub)
+    await response_cache.invalidate(user_id, "subscriptions")
 
     return {
         "detected": len(subscriptions),
@@ -649,10 +844,11 @@ async def get_cancellation_guide(
     if not subscription:
         raise HTTPException(404, "Subscription not found")
 
-    # Generate cancellation guide based on merchant
-    guide = await _get_cancellation_guide(subscription["merchant"])
-
-    return guide
+    # Guide bodies are pre-serialized; only the merchant name is encoded per request
+    return Response(
+        content=_cancellation_guide_json(subscription["merchant"]),
+        media_type="application/json"
+    )
 
 
 @app.post("/api/v1/subscriptions/{subscription_id}/mark-cancelled")
@@ -669,6 +865,7 @@ async def mark_subscription_cancelled(
 
     if not success:
         raise HTTPException(400, "Failed to update subscription")
+    await response_cache.invalidate(user_id, "subscriptions")
 
     return {"message": "Subscription marked as cancelled", "id": subscription_id}
 
@@ -683,19 +880,19 @@ async def get_negotiation_script(
     if not subscription:
         raise HTTPException(404, "Subscription not found")
 
-    script = await _get_negotiation_script(subscription)
-    return script
+    return Response(
+        content=_negotiation_script_json(subscription),
+        media_type="application/json"
+    )
 
 
 # ==================== GOALS ENDPOINTS ====================
 
 @app.get("/api/v1/goals")
+@cached_response("goals", ttl=30)
 async def get_goals(user_id: str = Depends(get_current_user)):
     """Get all savings goals"""
-    goals = await db.get_goals(user_id)
-
-    total_target = sum(g.get("target_amount", 0) for g in goals)
-    total_saved = sum(g.get("current_amount", 0) for g in goals)
+    goals, total_target, total_saved = await db.get_goals_with_totals(user_id)
 
     return {
         "goals": goals,
@@ -723,6 +920,7 @@ async def create_goal(
     }
 
     goal_id = await db.create_goal(user_id, goal)
+    await response_cache.invalidate(user_id, "goals")
 
     return {
         "message": "Goal created successfully",
@@ -757,6 +955,7 @@ async def update_goal(
     success = await db.update_goal(user_id, goal_id, updates)
     if not success:
         raise HTTPException(400, "Failed to update goal")
+    await response_cache.invalidate(user_id, "goals")
 
     return {"message": "Goal updated successfully"}
 
@@ -767,10 +966,20 @@ async def delete_goal(goal_id: str, user_id: str = Depends(get_current_user)):
     success = await db.delete_goal(user_id, goal_id)
     if not success:
         raise HTTPException(400, "Failed to delete goal")
+    await response_cache.invalidate(user_id, "goals")
 
     return {"message": "Goal deleted successfully"}
 
 
+GOAL_MILESTONES = (25, 50, 75, 100)
+GOAL_MILESTONE_MESSAGES = {
+    25: "Great start! 25% of your '{name}' goal achieved!",
+    50: "Halfway there! 50% of your '{name}' goal reached!",
+    75: "Amazing! You're 75% of the way to your '{name}' goal!",
+    100: "Congratulations! You've reached your '{name}' goal!",
+}
+
+
 @app.post("/api/v1/goals/{goal_id}/contribute")
 async def contribute_to_goal(
     goal_id: str,
@@ -789,19 +998,17 @@ async def contribute_to_goal(
 
     # Log contribution
     await db.log_goal_contribution(user_id, goal_id, request.amount)
+    await response_cache.invalidate(user_id, "goals")
 
-    # Check for milestone
-    progress = (new_amount / goal.get("target_amount", 1)) * 100
-    milestone_message = None
+    # Check for milestone: report the highest one this contribution crossed
+    target = goal.get("target_amount", 1)
+    prev_progress = (goal.get("current_amount", 0) / target) * 100
+    progress = (new_amount / target) * 100
 
-    if progress >= 100:
-        milestone_message = f"Congratulations! You've reached your '{goal['name']}' goal!"
-    elif progress >= 75 and (goal.get("current_amount", 0) / goal.get("target_amount", 1) * 100) < 75:
-        milestone_message = f"Amazing! You're 75% of the way to your '{goal['name']}' goal!"
-    elif progress >= 50 and (goal.get("current_amount", 0) / goal.get("target_amount", 1) * 100) < 50:
-        milestone_message = f"Halfway there! 50% of your '{goal['name']}' goal reached!"
-    elif progress >= 25 and (goal.get("current_amount", 0) / goal.get("target_amount", 1) * 100) < 25:
-        milestone_message = f"Great start! 25% of your '{goal['name']}' goal achieved!"
+    crossed = bisect.bisect_right(GOAL_MILESTONES, progress)
+    milestone_message = None
+    if crossed > bisect.bisect_right(GOAL_MILESTONES, prev_progress):
+        milestone_message = GOAL_MILESTONE_MESSAGES[GOAL_MILESTONES[crossed - 1]].format(name=goal["name"])
 
     return {
         "message": "Contribution recorded",
@@ -824,31 +1031,41 @@ async def get_goal_history(goal_id: str, user_id: str = Depends(get_current_user
 
 # ==================== HELPER FUNCTIONS ====================
 
-async def _build_chat_context(user_id: str) -> Dict[str, Any]:
+async def _build_chat_context(user_id: str, now: datetime) -> Dict[str, Any]:
     """Build context for chat with recent transactions, bills, etc."""
-    # Get balance
-    balance_summary = await ShadowBankingService.get_balance_summary(user_id)
-
-    # Get recent transactions
-    start_date = datetime.now() - timedelta(days=7)
-    recent_txns = await db.get_transactions(
-        user_id,
-        start_date=start_date,
-        limit=20
+    start_date = now - timedelta(days=7)
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    # Balance, recent transactions, upcoming bills and this month's spending
+    # are independent, so fetch them concurrently
+    balance_summary, activity, upcoming_bills = await asyncio.gather(
+        ShadowBankingService.get_balance_summary(user_id),
+        db.get_transactions_and_spending(
+            user_id, start_date, now, limit=20, spending_start=month_start
+        ),
+        BillDetector.calculate_upcoming_bills(user_id, 30),
+        return_exceptions=True
     )
 
-    # Get upcoming bills
-    upcoming_bills = await BillDetector.calculate_upcoming_bills(user_id, 30)
+    # A failed source is left out so chat still works with partial context
+    context: Dict[str, Any] = {}
+
+    if isinstance(balance_summary, Exception):
+        logger.warning("Chat context: balance unavailable: %s", balance_summary)
+    else:
+        context["balance"] = balance_summary["visible_balance"]
+        context["hidden_balance"] = balance_summary["hidden_balance"]
 
-    # Get spending by category (this month)
-    month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0)
-    spending = await db.get_spending_by_category(user_id, month_start, datetime.now())
+    if isinstance(upcoming_bills, Exception):
+        logger.warning("Chat context: upcoming bills unavailable: %s", upcoming_bills)
+    else:
+        context["upcoming_bills"] = upcoming_bills
 
-    return {
-        "balance": balance_summary["visible_balance"],
-        "hidden_balance": balance_summary["hidden_balance"],
-        "upcoming_bills": upcoming_bills,
-        "recent_transactions": [
+    if isinstance(activity, Exception):
+        logger.warning("Chat context: transactions unavailable: %s", activity)
+    else:
+        recent_txns, spending = activity
+        context["recent_transactions"] = [
             {
                 "date": txn["date"],
                 "amount": float(txn["amount"]),
@@ -856,55 +1073,85 @@ async def _build_chat_context(user_id: str) -> Dict[str, Any]:
                 "category": txn.get("category")
             }
             for txn in recent_txns
-        ],
-        "spending_by_category": {k: round(v, 2) for k, v in spending.items()}
-    }
+        ]
+        context["spending_by_category"] = {k: round(v, 2) for k, v in spending.items()}
 
+    return context
 
-async def _detect_subscription_patterns(transactions: list) -> list:
-    """Detect recurring subscription patterns from transactions"""
-    from collections import defaultdict
 
-    # Group transactions by merchant
-    merchant_txns = defaultdict(list)
-    for txn in transactions:
-        if txn.get("amount", 0) < 0:  # Only expenses
-            merchant_txns[txn.get("merchant", "").lower()].append(txn)
+KNOWN_SUBSCRIPTION_MERCHANTS = (
+    "netflix", "spotify", "hulu", "disney", "hbo", "amazon prime",
+    "apple music", "youtube premium", "adobe", "microsoft 365",
+    "dropbox", "icloud", "google one", "nordvpn", "expressvpn",
+    "gym", "fitness", "peloton", "crunchyroll", "paramount",
+    "audible", "kindle", "instacart", "doordash", "uber one"
+)
+_KNOWN_SUB_RE = keyword_pattern(KNOWN_SUBSCRIPTION_MERCHANTS)
+
+# Checked in order; the first category with a keyword in the merchant wins
+_SUBSCRIPTION_CATEGORY_PATTERNS = {
+    "Streaming": keyword_pattern(["netflix", "hulu", "disney", "hbo", "paramount", "peacock", "crunchyroll", "youtube"]),
+    "Music": keyword_pattern(["spotify", "apple music", "tidal", "pandora", "amazon music"]),
+    "Software": keyword_pattern(["adobe", "microsoft", "dropbox", "google", "icloud", "notion"]),
+    "Fitness": keyword_pattern(["gym", "fitness", "peloton", "planet fitness", "orange theory"]),
+    "Delivery": keyword_pattern(["doordash", "uber eats", "grubhub", "instacart", "uber one"]),
+    "Gaming": keyword_pattern(["xbox", "playstation", "nintendo", "steam", "ea play"]),
+}
+
+
+def _detect_subscription_patterns(transactions: list) -> list:
+    """Detect recurring subscription patterns from transactions"""
+    expenses = [txn for txn in transactions if txn.get("amount", 0) < 0]  # Only expenses
+    if not expenses:
+        return []
+
+    # Group transactions by merchant: one integer group id per transaction
+    merchants = [txn.get("merchant", "").lower() for txn in expenses]
+    keys, first_index, group, counts = np.unique(
+        merchants, return_index=True, return_inverse=True, return_counts=True
+    )
+    amounts = np.abs(np.fromiter(
+        (float(txn.get("amount", 0)) for txn in expenses),
+        dtype=np.float64,
+        count=len(expenses)
+    ))
+
+    # Per-merchant mean, and whether every charge is within 10% of it
+    means = np.bincount(group, weights=amounts) / counts
+    outliers = np.bincount(
+        group,
+        weights=np.abs(amounts - means[group]) >= means[group] * 0.1,
+        minlength=len(keys)
+    )
+    consistent = outliers == 0
 
     subscriptions = []
-    known_subscription_merchants = [
-        "netflix", "spotify", "hulu", "disney", "hbo", "amazon prime",
-        "apple music", "youtube premium", "adobe", "microsoft 365",
-        "dropbox", "icloud", "google one", "nordvpn", "expressvpn",
-        "gym", "fitness", "peloton", "crunchyroll", "paramount",
-        "audible", "kindle", "instacart", "doordash", "uber one"
-    ]
 
-    for merchant, txns in merchant_txns.items():
-        if len(txns) < 2:
+    # Walk merchants in order of first appearance
+    for g in np.argsort(first_index):
+        count = int(counts[g])
+        if count < 2:
             continue
 
+        merchant = str(keys[g])
+
         # Check if known subscription merchant
-        is_known = any(known in merchant for known in known_subscription_merchants)
+        is_known = _KNOWN_SUB_RE.search(merchant) is not None
 
         # Check for consistent amounts
-        amounts = [abs(t.get("amount", 0)) for t in txns]
-        avg_amount = sum(amounts) / len(amounts)
-        is_consistent = all(abs(a - avg_amount) < avg_amount * 0.1 for a in amounts)
+        avg_amount = float(means[g])
+        is_consistent = bool(consistent[g])
 
         # Check frequency (monthly = ~30 days between charges)
-        if len(txns) >= 2 and (is_known or is_consistent):
-            # Calculate average days between transactions
-            dates = sorted([t.get("date") for t in txns if t.get("date")])
-
+        if is_known or is_consistent:
             # Estimate monthly cost
             monthly_cost = avg_amount
 
             # Determine if unused (no transactions in last 30 days of activity)
-            is_unused = len(txns) >= 3 and is_consistent
+            is_unused = count >= 3 and is_consistent
 
             subscriptions.append({
-                "merchant": txns[0].get("merchant", merchant.title()),
+                "merchant": expenses[first_index[g]].get("merchant", merchant.title()),
                 "amount": round(avg_amount, 2),
                 "monthly_cost": round(monthly_cost, 2),
                 "annual_cost": round(monthly_cost * 12, 2),
@@ -917,168 +1164,176 @@ async def _detect_subscription_patterns(transactions: list) -> list:
     return subscriptions
 
 
+@lru_cache(maxsize=512)
 def _categorize_subscription(merchant: str) -> str:
-    """Categorize a subscription based on merchant name"""
-    merchant = merchant.lower()
-
-    streaming = ["netflix", "hulu", "disney", "hbo", "paramount", "peacock", "crunchyroll", "youtube"]
-    music = ["spotify", "apple music", "tidal", "pandora", "amazon music"]
-    software = ["adobe", "microsoft", "dropbox", "google", "icloud", "notion"]
-    fitness = ["gym", "fitness", "peloton", "planet fitness", "orange theory"]
-    delivery = ["doordash", "uber eats", "grubhub", "instacart", "uber one"]
-    gaming = ["xbox", "playstation", "nintendo", "steam", "ea play"]
-
-    if any(s in merchant for s in streaming):
-        return "Streaming"
-    elif any(s in merchant for s in music):
-        return "Music"
-    elif any(s in merchant for s in software):
-        return "Software"
-    elif any(s in merchant for s in fitness):
-        return "Fitness"
-    elif any(s in merchant for s in delivery):
-        return "Delivery"
-    elif any(s in merchant for s in gaming):
-        return "Gaming"
-    else:
-        return "Other"
-
-
-async def _get_cancellation_guide(merchant: str) -> dict:
-    """Get cancellation guide for a specific merchant"""
-    merchant_lower = merchant.lower()
-
-    # Cancellation difficulty ratings and guides
-    cancellation_guides = {
-        "netflix": {
-            "difficulty": "easy",
-            "steps": [
-                "Log into your Netflix account",
-                "Go to Account settings",
-                "Click 'Cancel Membership'",
-                "Confirm cancellation"
-            ],
-            "method": "web",
-            "estimated_time": "2 minutes",
-            "tips": ["You can reactivate anytime", "Access continues until billing period ends"],
-            "warnings": []
-        },
-        "spotify": {
-            "difficulty": "easy",
-            "steps": [
-                "Log into Spotify.com (not the app)",
-                "Go to Account > Subscription",
-                "Click 'Cancel Premium'",
-                "Confirm"
-            ],
-            "method": "web",
-            "estimated_time": "2 minutes",
-            "tips": ["Can't cancel through mobile app", "You keep free tier access"],
-            "warnings": []
-        },
-        "gym": {
-            "difficulty": "hard",
-            "steps": [
-                "Review your contract for cancellation terms",
-                "Visit gym in person (often required)",
-                "Fill out cancellation form",
-                "Get written confirmation",
-                "Monitor for continued charges"
-            ],
-            "method": "in_person",
-            "estimated_time": "30+ minutes",
-            "tips": ["Bring ID", "Ask for confirmation number", "Take photos of all paperwork"],
-            "warnings": ["May require 30-day notice", "Could have cancellation fee", "Some require certified mail"]
-        },
-        "adobe": {
-            "difficulty": "medium",
-            "steps": [
-                "Log into Adobe.com",
-                "Go to Plans & Products",
-                "Click 'Manage plan' then 'Cancel plan'",
-                "Go through retention offers",
-                "Confirm cancellation"
-            ],
-            "method": "web",
-            "estimated_time": "10 minutes",
-            "tips": ["They will offer discounts - be firm if you want to cancel"],
-            "warnings": ["Annual plans may have early termination fee (50% of remaining)"]
-        }
-    }
+    """Categorize a subscription based on a lowercased merchant name"""
+    for category, pattern in _SUBSCRIPTION_CATEGORY_PATTERNS.items():
+        if pattern.search(merchant):
+            return category
 
-    # Find matching guide
-    for key, guide in cancellation_guides.items():
-        if key in merchant_lower:
-            return {
-                "merchant": merchant,
-                **guide
-            }
+    return "Other"
 
-    # Default guide
-    return {
-        "merchant": merchant,
-        "difficulty": "medium",
+
+# Cancellation difficulty ratings and guides, matched by substring of the merchant name
+# (read-only: responses spread these into fresh dicts)
+_CANCELLATION_GUIDES = MappingProxyType({
+    "netflix": {
+        "difficulty": "easy",
         "steps": [
-            "Log into your account on their website",
-            "Find Account or Settings section",
-            "Look for Subscription or Billing options",
-            "Select Cancel or Downgrade",
-            "Confirm cancellation",
-            "Save confirmation email/number"
+            "Log into your Netflix account",
+            "Go to Account settings",
+            "Click 'Cancel Membership'",
+            "Confirm cancellation"
         ],
         "method": "web",
-        "estimated_time": "5-10 minutes",
-        "tips": [
-            "Check your email for account credentials",
-            "Screenshot all confirmation pages",
-            "Monitor bank statements for continued charges"
+        "estimated_time": "2 minutes",
+        "tips": ["You can reactivate anytime", "Access continues until billing period ends"],
+        "warnings": []
+    },
+    "spotify": {
+        "difficulty": "easy",
+        "steps": [
+            "Log into Spotify.com (not the app)",
+            "Go to Account > Subscription",
+            "Click 'Cancel Premium'",
+            "Confirm"
         ],
-        "warnings": [
-            "Some services require phone call to cancel",
-            "Watch for 'pause' vs actual 'cancel' options"
-        ]
+        "method": "web",
+        "estimated_time": "2 minutes",
+        "tips": ["Can't cancel through mobile app", "You keep free tier access"],
+        "warnings": []
+    },
+    "gym": {
+        "difficulty": "hard",
+        "steps": [
+            "Review your contract for cancellation terms",
+            "Visit gym in person (often required)",
+            "Fill out cancellation form",
+            "Get written confirmation",
+            "Monitor for continued charges"
+        ],
+        "method": "in_person",
+        "estimated_time": "30+ minutes",
+        "tips": ["Bring ID", "Ask for confirmation number", "Take photos of all paperwork"],
+        "warnings": ["May require 30-day notice", "Could have cancellation fee", "Some require certified mail"]
+    },
+    "adobe": {
+        "difficulty": "medium",
+        "steps": [
+            "Log into Adobe.com",
+            "Go to Plans & Products",
+            "Click 'Manage plan' then 'Cancel plan'",
+            "Go through retention offers",
+            "Confirm cancellation"
+        ],
+        "method": "web",
+        "estimated_time": "10 minutes",
+        "tips": ["They will offer discounts - be firm if you want to cancel"],
+        "warnings": ["Annual plans may have early termination fee (50% of remaining)"]
     }
+})
+_CANCELLATION_GUIDE_KEYS = tuple(_CANCELLATION_GUIDES)
+_CANCELLATION_GUIDE_RE = keyword_pattern(_CANCELLATION_GUIDE_KEYS)
+
+_DEFAULT_CANCELLATION_GUIDE = MappingProxyType({
+    "difficulty": "medium",
+    "steps": [
+        "Log into your account on their website",
+        "Find Account or Settings section",
+        "Look for Subscription or Billing options",
+        "Select Cancel or Downgrade",
+        "Confirm cancellation",
+        "Save confirmation email/number"
+    ],
+    "method": "web",
+    "estimated_time": "5-10 minutes",
+    "tips": [
+        "Check your email for account credentials",
+        "Screenshot all confirmation pages",
+        "Monitor bank statements for continued charges"
+    ],
+    "warnings": [
+        "Some services require phone call to cancel",
+        "Watch for 'pause' vs actual 'cancel' options"
+    ]
+})
+
+
+# Serialized guide fields without the opening brace, spliced after "merchant"
+_CANCELLATION_GUIDE_TAILS = MappingProxyType({
+    key: orjson.dumps(dict(guide))[1:] for key, guide in _CANCELLATION_GUIDES.items()
+})
+_DEFAULT_CANCELLATION_GUIDE_TAIL = orjson.dumps(dict(_DEFAULT_CANCELLATION_GUIDE))[1:]
+
+
+@lru_cache(maxsize=512)
+def _lookup_cancellation_guide(merchant_lower: str) -> bytes:
+    """Find the serialized guide fields for a lowercased merchant name"""
+    # One scan finds every guide key in the name; table order breaks ties
+    found = {match.group() for match in _CANCELLATION_GUIDE_RE.finditer(merchant_lower)}
+    if not found:
+        return _DEFAULT_CANCELLATION_GUIDE_TAIL
+    return _CANCELLATION_GUIDE_TAILS[min(found, key=_CANCELLATION_GUIDE_KEYS.index)]
+
+
+def _cancellation_guide_json(merchant: str) -> bytes:
+    """Get the JSON cancellation guide for a specific merchant"""
+    return b'{"merchant":%s,%s' % (
+        orjson.dumps(merchant),
+        _lookup_cancellation_guide(merchant.lower())
+    )
 
 
-async def _get_negotiation_script(subscription: dict) -> dict:
-    """Generate negotiation script for subscription discount"""
+# Everything in a negotiation script except the merchant/price specific lines
+# (tuples: allocated once, serialized as JSON arrays)
+_NEGOTIATION_SCRIPT_TEMPLATE = MappingProxyType({
+    "key_points": (
+        "Mention how long you've been a customer",
+        "Reference competitor pricing if lower",
+        "Be polite but firm about needing a discount",
+        "Ask for supervisor if initial rep says no"
+    ),
+    "phrases_to_use": (
+        "I'm comparing options and your competitors offer...",
+        "What retention offers do you have available?",
+        "I'd prefer to stay but I need a better rate",
+        "Can I speak to someone in the retention department?"
+    ),
+    "fallback_options": (
+        "Ask about downgrading to cheaper plan",
+        "Request pause/freeze instead of cancel",
+        "Ask about annual vs monthly pricing",
+        "Inquire about student/military discounts"
+    ),
+    "success_tips": (
+        "Call during business hours for better agents",
+        "Be prepared to actually cancel if needed",
+        "Many services have unpublished retention offers"
+    )
+})
+# Serialized template fields without the opening brace, spliced after the per-subscription head
+_NEGOTIATION_SCRIPT_TAIL = orjson.dumps(dict(_NEGOTIATION_SCRIPT_TEMPLATE))[1:]
+
+
+def _negotiation_script_json(subscription: dict) -> bytes:
+    """Generate the JSON negotiation script for a subscription discount"""
     merchant = subscription.get("merchant", "")
-    amount = subscription.get("amount", 0)
+    amount = float(subscription.get("amount", 0))  # asyncpg NUMERIC -> Decimal
 
-    return {
+    head = orjson.dumps({
         "merchant": merchant,
         "current_price": amount,
         "potential_savings": round(amount * 0.2, 2),  # Assume 20% possible
         "opening_line": f"Hi, I've been a loyal {merchant} customer and I'm considering canceling due to the cost. Before I do, I wanted to see if there are any retention offers or discounts available.",
-        "key_points": [
-            "Mention how long you've been a customer",
-            "Reference competitor pricing if lower",
-            "Be polite but firm about needing a discount",
-            "Ask for supervisor if initial rep says no"
-        ],
-        "phrases_to_use": [
-            "I'm comparing options and your competitors offer...",
-            "What retention offers do you have available?",
-            "I'd prefer to stay but I need a better rate",
-            "Can I speak to someone in the retention department?"
-        ],
-        "fallback_options": [
-            "Ask about downgrading to cheaper plan",
-            "Request pause/freeze instead of cancel",
-            "Ask about annual vs monthly pricing",
-            "Inquire about student/military discounts"
-        ],
-        "success_tips": [
-            "Call during business hours for better agents",
-            "Be prepared to actually cancel if needed",
-            "Many services have unpublished retention offers"
-        ]
-    }
+    })
+    return head[:-1] + b"," + _NEGOTIATION_SCRIPT_TAIL
 
 
 # ==================== ROUND-UP ENDPOINTS ====================
 
 class RoundUpConfigRequest(BaseModel):
+    model_config = _REQUEST_MODEL_CONFIG
+
     enabled: bool = True
     multiplier: float = 1.0  # 1x, 2x, 3x round-ups
     goal_id: Optional[str] = None
@@ -1153,6 +1408,8 @@ async def get_pending_roundups(user_id: str = Depends(get_current_user)):
 
 
 class TransferRoundUpsRequest(BaseModel):
+    model_config = _REQUEST_MODEL_CONFIG
+
     goal_id: str
 
 
@@ -1163,6 +1420,7 @@ async def transfer_roundups(
 ):
     """Transfer pending round-ups to a goal"""
     amount = await db.transfer_roundups(user_id, request.goal_id)
+    await response_cache.invalidate(user_id, "goals")
 
     return {
         "message": "Round-ups transferred successfully",
@@ -1174,30 +1432,39 @@ async def transfer_roundups(
 # ==================== FORECAST ENDPOINTS ====================
 
 @app.get("/api/v1/forecast")
+@cached_response("forecast", ttl=30)
 async def get_forecast(
     days: int = 30,
-    user_id: str = Depends(get_current_user)
+    user_id: str = Depends(get_current_user),
+    now: datetime = Depends(_now_dep)
 ):
     """Get cash flow forecast"""
-    # Get current balance
-    balance_summary = await ShadowBankingService.get_balance_summary(user_id)
+    return await _compute_forecast(user_id, days, now)
+
+
+async def _compute_forecast(user_id: str, days: int, now: datetime) -> Dict[str, Any]:
+    """Cash flow forecast shared by the forecast and forecast alerts endpoints"""
+    # Current balance, upcoming bills and the last 90 days of transactions
+    # (for average income) are independent, so fetch them concurrently
+    start_date = now - timedelta(days=90)
+    balance_summary, upcoming_bills, transactions = await asyncio.gather(
+        ShadowBankingService.get_balance_summary(user_id),
+        BillDetector.calculate_upcoming_bills(user_id, days),
+        db.get_transactions(user_id, start_date=start_date, end_date=now, limit=500)
+    )
     current_balance = balance_summary.get("visible_balance", 0)
 
-    # Get upcoming bills
-    upcoming_bills = await BillDetector.calculate_upcoming_bills(user_id, days)
-
-    # Get average income (look at last 90 days)
-    start_date = datetime.now() - timedelta(days=90)
-    transactions = await db.get_transactions(user_id, start_date=start_date, limit=500)
-
-    # Calculate average monthly income
-    income_txns = [t for t in transactions if t.get("amount", 0) > 0]
-    total_income = sum(t.get("amount", 0) for t in income_txns)
-    avg_monthly_income = (total_income / 3) if total_income > 0 else 0  # 3 months
+    # Income and expense totals in one vectorized pass
+    amounts = np.fromiter(
+        (float(t.get("amount", 0)) for t in transactions),
+        dtype=np.float64,
+        count=len(transactions)
+    )
+    total_income = float(amounts[amounts > 0].sum())
+    total_expenses = float(-amounts[amounts < 0].sum())
 
-    # Calculate average monthly expenses
-    expense_txns = [t for t in transactions if t.get("amount", 0) < 0]
-    total_expenses = abs(sum(t.get("amount", 0) for t in expense_txns))
+    # Average monthly income and expenses (3 months)
+    avg_monthly_income = (total_income / 3) if total_income > 0 else 0
     avg_monthly_expenses = (total_expenses / 3) if total_expenses > 0 else 0
 
     # Project balance
@@ -1236,53 +1503,67 @@ async def get_forecast(
 @app.get("/api/v1/forecast/daily")
 async def get_daily_projections(
     days: int = 14,
-    user_id: str = Depends(get_current_user)
+    user_id: str = Depends(get_current_user),
+    now: datetime = Depends(_now_dep)
 ):
     """Get day-by-day balance projections"""
-    # Get current balance
-    balance_summary = await ShadowBankingService.get_balance_summary(user_id)
+    # Current balance and upcoming bills, fetched concurrently
+    balance_summary, bills = await asyncio.gather(
+        ShadowBankingService.get_balance_summary(user_id),
+        db.get_upcoming_bills(user_id, days=days)
+    )
     current_balance = balance_summary.get("visible_balance", 0)
 
-    # Get upcoming bills
-    bills = await db.get_upcoming_bills(user_id, days=days)
-
-    # Create daily projections
-    projections = []
-    running_balance = current_balance
-
-    for day in range(days):
-        date = datetime.now() + timedelta(days=day)
-        date_str = date.strftime("%Y-%m-%d")
-
-        # Find bills due on this day
-        day_bills = [b for b in bills if b.get("next_due_date") and
-                    b["next_due_date"].strftime("%Y-%m-%d") == date_str]
+    # Bucket bills by day offset from today in one pass
+    today = now.date()
+    bills_by_day = defaultdict(list)
+    due_by_day = np.zeros(max(days, 0))
+    for b in bills:
+        due_date = b.get("next_due_date")
+        if not due_date:
+            continue
+        if isinstance(due_date, datetime):
+            due_date = due_date.date()
+        day = (due_date - today).days
+        if 0 <= day < days:
+            bills_by_day[day].append(b)
+            due_by_day[day] += float(b.get("amount", 0))
+
+    # Every day's projected balance in one cumulative sum
+    running_balances = current_balance - np.cumsum(due_by_day)
+    projected_balances = np.round(running_balances, 2)
+
+    projections = [
+        {
+            "date": (today + timedelta(days=day)).isoformat(),
+            "projected_balance": float(projected_balances[day]),
+            "bills_due": round(float(due_by_day[day]), 2),
+            "bills": [{"merchant": b.get("merchant"), "amount": b.get("amount")} for b in bills_by_day.get(day, ())],
+            "is_low": bool(running_balances[day] < 100)
+        }
+        for day in range(days)
+    ]
 
-        bills_due = sum(b.get("amount", 0) for b in day_bills)
-        running_balance -= bills_due
-
-        projections.append({
-            "date": date_str,
-            "projected_balance": round(running_balance, 2),
-            "bills_due": round(bills_due, 2),
-            "bills": [{"merchant": b.get("merchant"), "amount": b.get("amount")} for b in day_bills],
-            "is_low": running_balance < 100
-        })
+    # argmin returns the earliest day on ties
+    lowest = projections[int(np.argmin(projected_balances))] if projections else None
 
     return {
         "projections": projections,
-        "lowest_point": min(p["projected_balance"] for p in projections),
-        "lowest_date": min(projections, key=lambda p: p["projected_balance"])["date"]
+        "lowest_point": lowest["projected_balance"] if lowest else None,
+        "lowest_date": lowest["date"] if lowest else None
     }
 
 
 @app.get("/api/v1/forecast/alerts")
-async def get_forecast_alerts(user_id: str = Depends(get_current_user)):
+async def get_forecast_alerts(
+    user_id: str = Depends(get_current_user),
+    now: datetime = Depends(_now_dep)
+):
     """Get forecast-based alerts"""
     alerts = []
 
     # Get forecast data
-    forecast = await get_forecast(days=30, user_id=user_id)
+    forecast = await _compute_forecast(user_id, 30, now)
 
     # Check for low balance warning
     if forecast["projected_balance"] < 100:
@@ -1330,6 +1611,8 @@ async def get_forecast_alerts(user_id: str = Depends(get_current_user)):
 # ==================== SPENDING LIMITS ENDPOINTS ====================
 
 class SpendingLimitRequest(BaseModel):
+    model_config = _REQUEST_MODEL_CONFIG
+
     category: str
     amount: float
     period: str = "monthly"  # daily, weekly, monthly
@@ -1337,16 +1620,23 @@ class SpendingLimitRequest(BaseModel):
 
 
 @app.get("/api/v1/spending-limits")
-async def get_spending_limits(user_id: str = Depends(get_current_user)):
+async def get_spending_limits(
+    user_id: str = Depends(get_current_user),
+    now: datetime = Depends(_now_dep)
+):
     """Get all spending limits"""
     limits = await db.get_spending_limits(user_id)
 
-    # Check current spending for each limit
+    # Current spending for every limit in one round trip
+    spent_by_limit = await db.check_spending_limits_bulk(
+        user_id, [(limit["category"], limit["period"]) for limit in limits], now
+    )
     for limit in limits:
-        check = await db.check_spending_limit(user_id, limit["category"], limit["period"])
-        limit["current_spent"] = check.get("current_spent", 0)
-        limit["percent_used"] = check.get("percent_used", 0)
-        limit["is_exceeded"] = check.get("is_exceeded", False)
+        spent = spent_by_limit.get((limit["category"], limit["period"]), 0.0)
+        limit_amount = float(limit["limit_amount"])
+        limit["current_spent"] = spent
+        limit["percent_used"] = round(spent / limit_amount * 100, 1) if limit_amount > 0 else 0
+        limit["is_exceeded"] = spent > limit_amount
 
     return {"limits": limits}
 
@@ -1390,6 +1680,8 @@ async def delete_spending_limit(
 # ==================== WISHLIST ENDPOINTS ====================
 
 class WishlistItemRequest(BaseModel):
+    model_config = _REQUEST_MODEL_CONFIG
+
     name: str
     price: float
     priority: int = 3  # 1-5
@@ -1789,29 +2081,43 @@ async def _build_shopping_context(user_id: str) -> Dict[str, Any]:
 # ==================== ACHIEVEMENTS ENDPOINTS ====================
 
 @app.get("/api/v1/achievements")
-async def get_achievements(user_id: str = Depends(get_current_user)):
+async def get_achievements(
+    user_id: str = Depends(get_current_user),
+    now: datetime = Depends(_now_dep)
+):
     """Get user's achievements and progress"""
-    # Get user stats for achievement calculation
-    goals = await db.get_goals(user_id)
-    transactions = await db.get_transactions(user_id, limit=1000)
-    balance_summary = await ShadowBankingService.get_balance_summary(user_id)
+    # Get user stats for achievement calculation (independent, so concurrent).
+    # Transactions only need counting up to the highest threshold (last 90 days).
+    goals, transaction_count, balance_summary = await asyncio.gather(
+        db.get_goals(user_id),
+        db.count_transactions(user_id, now - timedelta(days=90), cap=100),
+        ShadowBankingService.get_balance_summary(user_id)
+    )
 
     # Calculate achievements
     achievements = []
 
-    # Goal achievements
-    completed_goals = [g for g in goals if g.get("current_amount", 0) >= g.get("target_amount", 1)]
-    if len(completed_goals) >= 1:
+    # Goal achievements: count completed goals, stopping at the highest threshold
+    completed_count = 0
+    first_completed = None
+    for g in goals:
+        if g.get("current_amount", 0) >= g.get("target_amount", 1):
+            completed_count += 1
+            first_completed = first_completed or g
+            if completed_count >= 5:
+                break
+
+    if first_completed:
         achievements.append({
             "id": "first_goal",
             "name": "Goal Getter",
             "description": "Complete your first savings goal",
             "icon": "🎯",
             "earned": True,
-            "earned_date": completed_goals[0].get("completed_at")
+            "earned_date": first_completed.get("completed_at")
         })
 
-    if len(completed_goals) >= 5:
+    if completed_count >= 5:
         achievements.append({
             "id": "goal_master",
             "name": "Goal Master",
@@ -1841,7 +2147,7 @@ async def get_achievements(user_id: str = Depends(get_current_user)):
         })
 
     # Transaction achievements
-    if len(transactions) >= 100:
+    if transaction_count >= 100:
         achievements.append({
             "id": "tracker",
             "name": "Transaction Tracker",
@@ -1872,7 +2178,7 @@ async def get_achievements(user_id: str = Depends(get_current_user)):
 
     return {
         "achievements": achievements,
-        "total_earned": len([a for a in achievements if a.get("earned")]),
+        "total_earned": sum(1 for a in achievements if a.get("earned")),
         "total_available": len(achievements)
     }
 
@@ -2015,7 +2321,7 @@ async def deals_get_deals(
         "total_deals": len(deals),
         "by_type": by_type,
         "deals": [d.to_dict() for d in deals],
-        "last_updated": datetime.utcnow().isoformat()
+        "last_updated": datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
     }
 
 
@@ -2349,17 +2655,38 @@ async def deals_get_stats(user_id: str = Depends(get_current_user)):
     }
 
 
+# ==================== ROUTER REGISTRATION ====================
+
+for router in (
+    auth_router,
+    chat_router,
+    plaid_router,
+    transactions_router,
+    bills_router,
+    money_router,
+    profile_router,
+    usage_router,
+):
+    app.include_router(router)
+
+
 # ==================== MAIN ====================
 
 if __name__ == "__main__":
-    import uvicorn
+    # Production runs `gunicorn main:app -c gunicorn.conf.py` (see Dockerfile);
+    # `python main.py` does the same when gunicorn is installed, and otherwise
+    # serves a single uvicorn process (DEBUG adds auto-reload)
+    if not _DEBUG_MODE and shutil.which("gunicorn"):
+        os.execvp("gunicorn", ["gunicorn", "main:app", "-c", "gunicorn.conf.py"])
 
-    port = int(os.getenv("PORT", 8000))
+    import uvicorn
 
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
-        port=port,
-        reload=os.getenv("DEBUG", "false").lower() == "true",
+        port=int(os.getenv("PORT", 8000)),
+        reload=_DEBUG_MODE,
+        loop="uvloop",
+        http="httptools",
         log_level="info"
     )
@@ -3,11 +3,18 @@ ML-based transaction categorization with Claude fallback
 """
 
 import os
-from typing import Tuple, Dict, Any
+import re
+import asyncio
+import logging
+from typing import Tuple, Dict, Any, List, Optional
 from datetime import datetime
 import anthropic
+import httpx
 
 from database import db
+from services.keywords import keyword_pattern
+
+logger = logging.getLogger(__name__)
 
 
 # Categories for classification
@@ -23,6 +30,112 @@ CATEGORIES = [
     "Transfer",
     "Other"
 ]
+_CATEGORIES_LOWER = tuple((category, category.lower()) for category in CATEGORIES)
+
+CATEGORY_EMOJI = {
+    "Food & Dining": "🍔",
+    "Transportation": "🚗",
+    "Entertainment": "🎬",
+    "Bills & Utilities": "📋",
+    "Shopping": "🛍️",
+    "Health & Fitness": "💪",
+    "Travel": "✈️",
+    "Income": "💰",
+    "Transfer": "💸",
+    "Other": "📦"
+}
+
+
+# Fallback per-transaction Claude calls in flight at once for one batch
+CLAUDE_CONCURRENCY = 8
+
+# Give up on a hung Claude call rather than hold the request (seconds)
+CLAUDE_TIMEOUT = 10
+CLAUDE_BATCH_TIMEOUT = 30
+
+# "3. Food & Dining" -> "Food & Dining"
+_LINE_NUMBER_RE = re.compile(r"^\s*\d+\s*[.):-]?\s*")
+
+# Returned when Claude can't be reached; never cached
+CLAUDE_FAILED = ("Other", 0.3)
+
+# Claude answers per normalized merchant, so a recurring merchant
+# ("STARBUCKS #1234", "STARBUCKS #0871") costs one call per process
+CATEGORY_CACHE_MAX = 50_000
+_category_cache: Dict[Tuple[str, bool, str], Tuple[str, float]] = {}
+
+# Store numbers and reference digits that vary between charges
+_MERCHANT_NOISE_RE = re.compile(r"[#*]?\d+")
+
+
+def _category_cache_key(transaction: Dict[str, Any], user_context: str) -> Tuple[str, bool, str]:
+    """(normalized merchant, is income, user context)"""
+    merchant = " ".join(_MERCHANT_NOISE_RE.sub(" ", transaction["merchant"].lower()).split())
+    return merchant, float(transaction.get("amount", 0)) > 0, user_context
+
+
+def _remember_category(key: Tuple[str, bool, str], result: Tuple[str, float]) -> None:
+    """Cache a Claude answer, dropping the oldest entry when full"""
+    if result == CLAUDE_FAILED:
+        return
+    if len(_category_cache) >= CATEGORY_CACHE_MAX:
+        del _category_cache[next(iter(_category_cache))]
+    _category_cache[key] = result
+
+# Only consulted for positive amounts
+_INCOME_RULES = (
+    ("Income", keyword_pattern(["payroll", "salary", "deposit", "direct dep"])),
+    ("Transfer", keyword_pattern(["transfer", "venmo", "zelle"])),
+)
+
+# Checked in order; the first category with a keyword in the merchant wins
+_CATEGORY_RULES = (
+    ("Bills & Utilities", keyword_pattern([
+        "electric", "power", "utility", "internet", "verizon", "at&t",
+        "tmobile", "sprint", "insurance", "rent", "mortgage", "loan"
+    ])),
+    ("Food & Dining", keyword_pattern([
+        "restaurant", "cafe", "coffee", "starbucks", "mcdonald",
+        "burger", "pizza", "food", "grocery", "whole foods", "trader joe",
+        "safeway", "kroger", "publix", "chipotle", "subway"
+    ])),
+    ("Transportation", keyword_pattern([
+        "uber", "lyft", "taxi", "shell", "chevron", "exxon", "bp",
+        "gas", "parking", "transit", "metro", "bart"
+    ])),
+    ("Entertainment", keyword_pattern([
+        "netflix", "spotify", "hulu", "disney", "amazon prime",
+        "youtube", "movie", "theater", "cinema", "concert", "tickets"
+    ])),
+    ("Health & Fitness", keyword_pattern([
+        "gym", "fitness", "yoga", "pharmacy", "cvs", "walgreens",
+        "hospital", "doctor", "dental", "medical"
+    ])),
+    ("Travel", keyword_pattern([
+        "airline", "hotel", "airbnb", "booking", "expedia",
+        "tsa", "airport"
+    ])),
+)
+
+
+# One Claude client (and connection pool) per process, shared by every
+# categorizer; created on first use so it's never inherited across a fork
+_anthropic_client: Optional[anthropic.AsyncAnthropic] = None
+
+
+def _get_anthropic_client() -> anthropic.AsyncAnthropic:
+    """Get or create the shared Claude client"""
+    global _anthropic_client
+    if _anthropic_client is None:
+        _anthropic_client = anthropic.AsyncAnthropic(
+            api_key=os.getenv("ANTHROPIC_API_KEY"),
+            max_retries=2,
+            timeout=CLAUDE_BATCH_TIMEOUT,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+            )
+        )
+    return _anthropic_client
 
 
 class TransactionCategorizer:
@@ -33,9 +146,6 @@ class TransactionCategorizer:
     with Claude as fallback. For now, uses Claude directly for accuracy.
     """
 
-    def __init__(self):
-        self.client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-
     async def categorize(self, transaction: Dict[str, Any], user_context: str = "") -> Tuple[str, float]:
         """
         Categorize a transaction
@@ -51,8 +161,14 @@ class TransactionCategorizer:
         if simple_category := self._try_simple_rules(transaction):
             return simple_category, 0.95
 
-        # Use Claude for unclear cases
-        return await self._categorize_with_claude(transaction, user_context)
+        # Use Claude for unclear cases, once per normalized merchant
+        key = _category_cache_key(transaction, user_context)
+        if cached := _category_cache.get(key):
+            return cached
+
+        result = await self._categorize_with_claude(transaction, user_context)
+        _remember_category(key, result)
+        return result
 
     def _try_simple_rules(self, txn: Dict[str, Any]) -> str:
         """
@@ -66,53 +182,13 @@ class TransactionCategorizer:
 
         # Income (positive amounts)
         if amount > 0:
-            if any(word in merchant for word in ["payroll", "salary", "deposit", "direct dep"]):
-                return "Income"
-            if "transfer" in merchant or "venmo" in merchant or "zelle" in merchant:
-                return "Transfer"
-
-        # Bills & Utilities
-        if any(word in merchant for word in [
-            "electric", "power", "utility", "internet", "verizon", "at&t",
-            "tmobile", "sprint", "insurance", "rent", "mortgage", "loan"
-        ]):
-            return "Bills & Utilities"
-
-        # Food
-        if any(word in merchant for word in [
-            "restaurant", "cafe", "coffee", "starbucks", "mcdonald",
-            "burger", "pizza", "food", "grocery", "whole foods", "trader joe",
-            "safeway", "kroger", "publix", "chipotle", "subway"
-        ]):
-            return "Food & Dining"
-
-        # Transportation
-        if any(word in merchant for word in [
-            "uber", "lyft", "taxi", "shell", "chevron", "exxon", "bp",
-            "gas", "parking", "transit", "metro", "bart"
-        ]):
-            return "Transportation"
-
-        # Entertainment
-        if any(word in merchant for word in [
-            "netflix", "spotify", "hulu", "disney", "amazon prime",
-            "youtube", "movie", "theater", "cinema", "concert", "tickets"
-        ]):
-            return "Entertainment"
-
-        # Health & Fitness
-        if any(word in merchant for word in [
-            "gym", "fitness", "yoga", "pharmacy", "cvs", "walgreens",
-            "hospital", "doctor", "dental", "medical"
-        ]):
-            return "Health & Fitness"
-
-        # Travel
-        if any(word in merchant for word in [
-            "airline", "hotel", "airbnb", "booking", "expedia",
-            "tsa", "airport"
-        ]):
-            return "Travel"
+            for category, pattern in _INCOME_RULES:
+                if pattern.search(merchant):
+                    return category
+
+        for category, pattern in _CATEGORY_RULES:
+            if pattern.search(merchant):
+                return category
 
         return None
 
@@ -131,10 +207,7 @@ class TransactionCategorizer:
         Returns:
             Tuple of (category, confidence)
         """
-        merchant = transaction["merchant"]
-        amount = abs(float(transaction["amount"]))
-        date = transaction.get("date", datetime.now())
-        time_str = date.strftime("%I:%M %p, %A") if isinstance(date, datetime) else "unknown time"
+        merchant, amount, time_str = self._describe(transaction)
 
         prompt = f"""Categorize this transaction into ONE of these categories:
 
@@ -154,10 +227,13 @@ Transaction:
 Respond with ONLY the category name, nothing else. Be precise."""
 
         try:
-            response = self.client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=50,
-                messages=[{"role": "user", "content": prompt}]
+            response = await asyncio.wait_for(
+                _get_anthropic_client().messages.create(
+                    model="claude-sonnet-4-20250514",
+                    max_tokens=50,
+                    messages=[{"role": "user", "content": prompt}]
+                ),
+                timeout=CLAUDE_TIMEOUT
             )
 
             category = response.content[0].text.strip()
@@ -169,16 +245,101 @@ Respond with ONLY the category name, nothing else. Be precise."""
 
             return category, 0.85
 
-        except Exception as e:
-            print(f"Claude categorization failed: {e}")
-            return "Other", 0.3
+        except Exception:
+            logger.exception("Claude categorization failed")
+            return CLAUDE_FAILED
+
+    async def _categorize_batch_with_claude(
+        self,
+        transactions: List[Dict[str, Any]],
+        user_context: str = ""
+    ) -> List[Tuple[str, float]]:
+        """
+        Categorize several transactions with one Claude call
+
+        Falls back to concurrent per-transaction calls if the reply
+        doesn't have exactly one category per transaction.
+
+        Args:
+            transactions: Transaction dicts rules couldn't categorize
+            user_context: User spending patterns
+
+        Returns:
+            List of (category, confidence) tuples, in input order
+        """
+        if len(transactions) == 1:
+            return [await self._categorize_with_claude(transactions[0], user_context)]
+
+        lines = []
+        for i, txn in enumerate(transactions, 1):
+            merchant, amount, time_str = self._describe(txn)
+            lines.append(f"{i}. {merchant} | ${amount:.2f} | {time_str}")
+
+        prompt = f"""Categorize each of these {len(transactions)} transactions into ONE of these categories:
+
+{', '.join(CATEGORIES)}
+
+Transactions (merchant | amount | time):
+""" + "\n".join(lines) + "\n"
+
+        if user_context:
+            prompt += f"\nUser context: {user_context}"
+
+        prompt += f"""
+
+Respond with exactly {len(transactions)} lines, one category name per line, in the same order. Nothing else."""
+
+        try:
+            response = await asyncio.wait_for(
+                _get_anthropic_client().messages.create(
+                    model="claude-sonnet-4-20250514",
+                    max_tokens=20 * len(transactions),
+                    messages=[{"role": "user", "content": prompt}]
+                ),
+                timeout=CLAUDE_BATCH_TIMEOUT
+            )
+
+            answers = [
+                _LINE_NUMBER_RE.sub("", line).strip()
+                for line in response.content[0].text.splitlines()
+                if line.strip()
+            ]
+            if len(answers) == len(transactions):
+                return [
+                    (category if category in CATEGORIES else self._find_closest_category(category), 0.85)
+                    for category in answers
+                ]
+
+            logger.warning(
+                "Claude batch categorization returned %d lines for %d transactions",
+                len(answers), len(transactions)
+            )
+
+        except Exception:
+            logger.exception("Claude batch categorization failed")
+
+        # Fall back to one call per transaction, a few at a time
+        semaphore = asyncio.Semaphore(CLAUDE_CONCURRENCY)
+
+        async def categorize_one(txn: Dict[str, Any]) -> Tuple[str, float]:
+            async with semaphore:
+                return await self._categorize_with_claude(txn, user_context)
+
+        return list(await asyncio.gather(*(categorize_one(txn) for txn in transactions)))
+
+    @staticmethod
+    def _describe(transaction: Dict[str, Any]) -> Tuple[str, float, str]:
+        """Merchant, absolute amount and a readable time for prompts"""
+        date = transaction.get("date", datetime.now())
+        time_str = date.strftime("%I:%M %p, %A") if isinstance(date, datetime) else "unknown time"
+        return transaction["merchant"], abs(float(transaction["amount"])), time_str
 
     def _find_closest_category(self, text: str) -> str:
         """Find closest matching category from Claude's response"""
         text_lower = text.lower()
 
-        for category in CATEGORIES:
-            if category.lower() in text_lower or text_lower in category.lower():
+        for category, category_lower in _CATEGORIES_LOWER:
+            if category_lower in text_lower or text_lower in category_lower:
                 return category
 
         return "Other"
@@ -215,6 +376,9 @@ Respond with ONLY the category name, nothing else. Be precise."""
         """
         Categorize multiple transactions efficiently
 
+        Rule hits and cached merchants are resolved locally; each remaining
+        distinct merchant goes to Claude once, in a single batched prompt.
+
         Args:
             transactions: List of transaction dicts
             user_context: User context
@@ -222,29 +386,35 @@ Respond with ONLY the category name, nothing else. Be precise."""
         Returns:
             List of (category, confidence) tuples
         """
-        results = []
-
-        for txn in transactions:
-            category, confidence = await self.categorize(txn, user_context)
-            results.append((category, confidence))
+        results: List[Tuple[str, float]] = [None] * len(transactions)
+        unknown: Dict[Tuple[str, bool, str], List[int]] = {}  # cache key -> indices
+
+        for i, txn in enumerate(transactions):
+            if simple_category := self._try_simple_rules(txn):
+                results[i] = (simple_category, 0.95)
+                continue
+
+            key = _category_cache_key(txn, user_context)
+            if cached := _category_cache.get(key):
+                results[i] = cached
+            else:
+                unknown.setdefault(key, []).append(i)
+
+        if unknown:
+            categorized = await self._categorize_batch_with_claude(
+                [transactions[indices[0]] for indices in unknown.values()],
+                user_context
+            )
+            for (key, indices), result in zip(unknown.items(), categorized):
+                _remember_category(key, result)
+                for i in indices:
+                    results[i] = result
 
         return results
 
     def get_category_emoji(self, category: str) -> str:
         """Get emoji for category (for fun UI)"""
-        emoji_map = {
-            "Food & Dining": "🍔",
-            "Transportation": "🚗",
-            "Entertainment": "🎬",
-            "Bills & Utilities": "📋",
-            "Shopping": "🛍️",
-            "Health & Fitness": "💪",
-            "Travel": "✈️",
-            "Income": "💰",
-            "Transfer": "💸",
-            "Other": "📦"
-        }
-        return emoji_map.get(category, "❓")
+        return CATEGORY_EMOJI.get(category, "❓")
 
 
 # Singleton instance
@@ -4,48 +4,203 @@ Prevents API abuse and manages Claude API costs
 """
 
 import time
-from typing import Dict, Callable
-from datetime import datetime
-from functools import wraps
-from collections import defaultdict
+import uuid
+import asyncio
+from typing import Any, Dict, Callable, List, Optional, Tuple
+from datetime import datetime, timezone
+from functools import wraps, lru_cache
+from collections import defaultdict, deque
+import orjson
 from fastapi import HTTPException, Request
 from database import db
+from redis_client import get_redis
+
+# Try to import tiktoken, fall back to the 4-characters-per-token estimate
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
 
 
 # In-memory request tracking (use Redis in production for multi-instance deployments)
-user_requests: Dict[str, list] = defaultdict(list)
-user_token_usage: Dict[str, int] = defaultdict(int)
+user_requests: Dict[str, deque] = defaultdict(deque)
+ip_requests: Dict[str, deque] = defaultdict(deque)
 
 # Rate limits
 MAX_REQUESTS_PER_MINUTE = 10
 MAX_TOKENS_PER_DAY = 100000
 MAX_COST_PER_DAY = 5.0  # $5 per day per user
 
+# Claude pricing per token ($3 / $15 per million input / output tokens)
+INPUT_COST_PER_TOKEN = 3.0 / 1_000_000
+OUTPUT_COST_PER_TOKEN = 15.0 / 1_000_000
+# Prompt cache reads bill at 0.1x input, cache writes at 1.25x
+CACHE_READ_COST_PER_TOKEN = 0.30 / 1_000_000
+CACHE_WRITE_COST_PER_TOKEN = 3.75 / 1_000_000
+
+# Idle in-memory request windows are dropped this often (seconds)
+REQUEST_WINDOW_GC_INTERVAL = 60
+
+# API usage rows are buffered and written in batches
+USAGE_FLUSH_BATCH = 100
+USAGE_FLUSH_INTERVAL = 1.0  # seconds
+
+# Redis usage hashes outlive the day they count so late requests still see them
+USAGE_KEY_TTL = 2 * 86400
+
+# Sliding-window request check and daily budget check in one round trip.
+# The request is only added to the window once both checks pass, so a
+# rate-limited call never counts against the window or the budget.
+#   KEYS: request window zset, today's usage hash
+#   ARGV: now_ms, window_ms, max_requests, max_tokens, max_cost, member
+# Returns 1 allowed, 0 rate limited, 2 tokens exhausted, 3 cost exhausted,
+# -1 allowed but usage hash not seeded yet (caller checks the database)
+RATE_LIMIT_LUA = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - window)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+    return 0
+end
+local usage = redis.call('HMGET', KEYS[2], 'input', 'output', 'cost')
+if usage[1] then
+    if tonumber(usage[1]) + tonumber(usage[2]) >= tonumber(ARGV[4]) then
+        return 2
+    end
+    if tonumber(usage[3]) >= tonumber(ARGV[5]) then
+        return 3
+    end
+end
+redis.call('ZADD', KEYS[1], now, ARGV[6])
+redis.call('PEXPIRE', KEYS[1], window)
+if usage[1] then
+    return 1
+end
+return -1
+"""
 
-def rate_limit_check(user_id: str) -> None:
+# Add a call's usage to today's hash, only once it has been seeded from the database
+RECORD_USAGE_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HINCRBY', KEYS[1], 'input', ARGV[1])
+    redis.call('HINCRBY', KEYS[1], 'output', ARGV[2])
+    redis.call('HINCRBYFLOAT', KEYS[1], 'cost', ARGV[3])
+    redis.call('HINCRBY', KEYS[1], 'requests', 1)
+end
+return 0
+"""
+
+# Seed today's hash from the database totals unless it already exists, so
+# a racing seed never wipes usage recorded since the first one
+#   KEYS: today's usage hash
+#   ARGV: input, output, cost, requests, ttl_seconds
+# Returns 1 seeded, 0 already seeded
+SEED_USAGE_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'input', ARGV[1], 'output', ARGV[2], 'cost', ARGV[3], 'requests', ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return 1
+"""
+
+# Plain sliding-window check for unauthenticated limits (per IP)
+#   KEYS: request window zset
+#   ARGV: now_ms, window_ms, max_requests, member
+# Returns 1 allowed, 0 rate limited
+SLIDING_WINDOW_LUA = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - window)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now, ARGV[4])
+redis.call('PEXPIRE', KEYS[1], window)
+return 1
+"""
+
+_rate_limit_script = None
+_record_usage_script = None
+_sliding_window_script = None
+_seed_usage_script = None
+
+
+def _register_scripts(redis_client) -> None:
+    """Register the Lua scripts once; later calls go through EVALSHA"""
+    global _rate_limit_script, _record_usage_script, _sliding_window_script, _seed_usage_script
+    if _rate_limit_script is None:
+        _rate_limit_script = redis_client.register_script(RATE_LIMIT_LUA)
+        _record_usage_script = redis_client.register_script(RECORD_USAGE_LUA)
+        _sliding_window_script = redis_client.register_script(SLIDING_WINDOW_LUA)
+        _seed_usage_script = redis_client.register_script(SEED_USAGE_LUA)
+
+
+# (UTC day number, "YYYYMMDD"): the date string is only formatted when the day rolls over
+_usage_day = (-1, "")
+
+
+def _usage_key(user_id: str) -> str:
+    global _usage_day
+    day = int(time.time() // 86400)
+    if day != _usage_day[0]:
+        _usage_day = (day, f"{datetime.fromtimestamp(day * 86400, timezone.utc):%Y%m%d}")
+    return f"usage:{user_id}:{_usage_day[1]}"
+
+
+def _raise_rate_limited() -> None:
+    raise HTTPException(
+        status_code=429,
+        detail=f"Slow down. Roast limit: {MAX_REQUESTS_PER_MINUTE}/min. You're too chatty."
+    )
+
+
+def _raise_tokens_exhausted() -> None:
+    raise HTTPException(
+        status_code=429,
+        detail=f"Daily chat quota reached ({MAX_TOKENS_PER_DAY:,} tokens). You talk too much. Try again tomorrow."
+    )
+
+
+def _raise_cost_exhausted() -> None:
+    raise HTTPException(
+        status_code=429,
+        detail=f"Daily cost limit reached (${MAX_COST_PER_DAY}). Take a break."
+    )
+
+
+def _window_allows(windows: Dict[str, deque], key: str, max_requests: int) -> bool:
     """
-    Check if user has exceeded rate limits
+    Check and record a request in an in-process sliding window
 
-    Raises:
-        HTTPException: If rate limit exceeded
+    No awaits, so check-and-record is atomic with respect to other
+    requests on this event loop.
     """
     now = time.time()
     minute_ago = now - 60
 
-    # Clean old requests
-    requests = user_requests[user_id]
-    requests = [t for t in requests if t > minute_ago]
-    user_requests[user_id] = requests
+    # Timestamps are appended in order, so expired ones are all at the left
+    requests = windows[key]
+    while requests and requests[0] <= minute_ago:
+        requests.popleft()
 
-    # Check request count
-    if len(requests) >= MAX_REQUESTS_PER_MINUTE:
-        raise HTTPException(
-            status_code=429,
-            detail=f"Slow down. Roast limit: {MAX_REQUESTS_PER_MINUTE}/min. You're too chatty."
-        )
+    if len(requests) >= max_requests:
+        return False
 
-    # Add current request
     requests.append(now)
+    return True
+
+
+def rate_limit_check(user_id: str) -> None:
+    """
+    Check if user has exceeded rate limits
+
+    Raises:
+        HTTPException: If rate limit exceeded
+    """
+    if not _window_allows(user_requests, user_id, MAX_REQUESTS_PER_MINUTE):
+        _raise_rate_limited()
 
 
 async def token_limit_check(user_id: str) -> None:
@@ -55,22 +210,154 @@ async def token_limit_check(user_id: str) -> None:
     Raises:
         HTTPException: If token limit exceeded
     """
-    # Get today's usage from database
-    usage = await db.get_user_api_usage_today(user_id)
-    total_tokens = usage["input_tokens"] + usage["output_tokens"]
-    total_cost = float(usage["total_cost"])
-
-    if total_tokens >= MAX_TOKENS_PER_DAY:
-        raise HTTPException(
-            status_code=429,
-            detail=f"Daily chat quota reached ({MAX_TOKENS_PER_DAY:,} tokens). You talk too much. Try again tomorrow."
+    usage = await get_usage_today(user_id)
+    _check_usage(usage)
+
+
+async def _seed_usage(redis_client, usage_key: str, usage: Dict[str, Any]) -> None:
+    """Write today's database totals into the Redis usage hash, unless another request already did"""
+    _register_scripts(redis_client)
+    try:
+        await _seed_usage_script(
+            keys=[usage_key],
+            args=[
+                usage["input_tokens"],
+                usage["output_tokens"],
+                float(usage["total_cost"]),
+                usage["requests"],
+                USAGE_KEY_TTL,
+            ],
+            client=redis_client
         )
+    except Exception as e:
+        print(f"Failed to seed Redis usage {usage_key}: {e}")
+
+
+async def get_usage_today(user_id: str) -> Dict[str, Any]:
+    """
+    Today's usage in the database row shape
+
+    Read from the Redis usage hash when available; on a miss the
+    database totals are fetched and used to seed the hash.
+    """
+    redis_client = get_redis()
+    if redis_client is None:
+        return await db.get_user_api_usage_today(user_id)
+
+    usage_key = _usage_key(user_id)
+    try:
+        values = await redis_client.hmget(usage_key, "input", "output", "cost", "requests")
+    except Exception as e:
+        print(f"Redis usage read failed, using database: {e}")
+        return await db.get_user_api_usage_today(user_id)
+
+    if values[0] is None:
+        usage = await db.get_user_api_usage_today(user_id)
+        await _seed_usage(redis_client, usage_key, usage)
+        return usage
+
+    input_tokens, output_tokens, cost, requests = values
+    return {
+        "input_tokens": int(input_tokens),
+        "output_tokens": int(output_tokens),
+        "total_cost": float(cost),
+        "requests": int(requests or 0),
+    }
+
+
+def _check_usage(usage: Dict[str, Any]) -> None:
+    """Raise if today's usage (database row shape) is over budget"""
+    if usage["input_tokens"] + usage["output_tokens"] >= MAX_TOKENS_PER_DAY:
+        _raise_tokens_exhausted()
+
+    # Decimal (database) and float (Redis) both compare against a float directly
+    if usage["total_cost"] >= MAX_COST_PER_DAY:
+        _raise_cost_exhausted()
+
 
-    if total_cost >= MAX_COST_PER_DAY:
-        raise HTTPException(
-            status_code=429,
-            detail=f"Daily cost limit reached (${MAX_COST_PER_DAY}). Take a break."
+async def redis_limit_check(redis_client, user_id: str) -> None:
+    """
+    Rate limit and budget check against Redis in a single script call
+
+    Falls back to the in-process window plus a database budget check
+    if Redis errors.
+
+    Raises:
+        HTTPException: If rate or budget limit exceeded
+    """
+    _register_scripts(redis_client)
+    usage_key = _usage_key(user_id)
+
+    try:
+        status = await _rate_limit_script(
+            keys=[f"rl:{user_id}", usage_key],
+            args=[
+                int(time.time() * 1000),
+                60_000,
+                MAX_REQUESTS_PER_MINUTE,
+                MAX_TOKENS_PER_DAY,
+                MAX_COST_PER_DAY,
+                uuid.uuid4().hex,
+            ],
+            client=redis_client
         )
+    except Exception as e:
+        print(f"Redis rate limit check failed, using in-process limits: {e}")
+        rate_limit_check(user_id)
+        await token_limit_check(user_id)
+        return
+
+    if status == 0:
+        _raise_rate_limited()
+    if status == 2:
+        _raise_tokens_exhausted()
+    if status == 3:
+        _raise_cost_exhausted()
+
+    if status == -1:
+        # First check of the day for this user: seed the hash from the database
+        usage = await db.get_user_api_usage_today(user_id)
+        await _seed_usage(redis_client, usage_key, usage)
+        _check_usage(usage)
+
+
+def prune_request_windows() -> None:
+    """Drop expired timestamps and forget users/IPs with no recent requests"""
+    minute_ago = time.time() - 60
+    for windows in (user_requests, ip_requests):
+        for key in list(windows):
+            requests = windows[key]
+            # Windows are time-ordered: idle ones end before the cutoff
+            if not requests or requests[-1] <= minute_ago:
+                del windows[key]
+
+
+_request_window_gc: Optional[asyncio.Task] = None
+
+
+async def _prune_request_windows_forever() -> None:
+    while True:
+        await asyncio.sleep(REQUEST_WINDOW_GC_INTERVAL)
+        prune_request_windows()
+
+
+def start_request_window_gc() -> None:
+    """Start pruning the in-memory request windows (call on startup)"""
+    global _request_window_gc
+    if _request_window_gc is None:
+        _request_window_gc = asyncio.create_task(_prune_request_windows_forever())
+
+
+async def stop_request_window_gc() -> None:
+    """Stop the request window pruner"""
+    global _request_window_gc
+    if _request_window_gc is not None:
+        _request_window_gc.cancel()
+        try:
+            await _request_window_gc
+        except asyncio.CancelledError:
+            pass
+        _request_window_gc = None
 
 
 def rate_limit(func: Callable) -> Callable:
@@ -97,8 +384,12 @@ def rate_limit(func: Callable) -> Callable:
             raise HTTPException(401, "Authentication required for rate limiting")
 
         # Check rate limits
-        rate_limit_check(user_id)
-        await token_limit_check(user_id)
+        redis_client = get_redis()
+        if redis_client is not None:
+            await redis_limit_check(redis_client, user_id)
+        else:
+            rate_limit_check(user_id)
+            await token_limit_check(user_id)
 
         # Execute function
         return await func(*args, **kwargs)
@@ -108,58 +399,159 @@ def rate_limit(func: Callable) -> Callable:
 
 # Token counting utilities
 
+_encoding = None
+
+
+def _get_encoding():
+    """Load the BPE encoding on first use; None if tiktoken is unusable"""
+    global _encoding, TIKTOKEN_AVAILABLE
+    if _encoding is None and TIKTOKEN_AVAILABLE:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"tiktoken encoding unavailable, estimating tokens from length: {e}")
+            TIKTOKEN_AVAILABLE = False
+    return _encoding
+
+
+@lru_cache(maxsize=4096)
 def estimate_tokens(text: str) -> int:
     """
     Estimate token count for text
-    Rough estimate: 1 token ≈ 4 characters
+
+    BPE count with tiktoken's cl100k_base when available (close to, not
+    exactly, Claude's tokenizer); otherwise 1 token ≈ 4 characters.
+    Cached since chat history is re-counted on every turn.
     """
-    return len(text) // 4
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4
+    return len(encoding.encode(text, disallowed_special=()))
 
 
 def count_message_tokens(messages: list) -> int:
     """Count tokens in message list"""
-    total = 0
-    for msg in messages:
-        content = msg.get("content", "")
-        total += estimate_tokens(content)
-        # Add overhead for message formatting
-        total += 4
-    return total
+    # 4 tokens of formatting overhead per message
+    return sum(estimate_tokens(msg.get("content", "")) for msg in messages) + 4 * len(messages)
 
 
-def calculate_cost(input_tokens: int, output_tokens: int) -> float:
+def calculate_cost(
+    input_tokens: int,
+    output_tokens: int,
+    cache_read_tokens: int = 0,
+    cache_write_tokens: int = 0
+) -> float:
     """
     Calculate cost for Claude API usage
 
     Claude Sonnet 4.5 pricing (as of Jan 2025):
     - Input: $3 per million tokens
     - Output: $15 per million tokens
+    - Prompt cache: $0.30 per million read, $3.75 per million written
     """
-    input_cost = (input_tokens / 1_000_000) * 3.0
-    output_cost = (output_tokens / 1_000_000) * 15.0
-    return input_cost + output_cost
+    return (
+        input_tokens * INPUT_COST_PER_TOKEN
+        + output_tokens * OUTPUT_COST_PER_TOKEN
+        + cache_read_tokens * CACHE_READ_COST_PER_TOKEN
+        + cache_write_tokens * CACHE_WRITE_COST_PER_TOKEN
+    )
+
+
+# Pending api_usage rows: (user_id, endpoint, input_tokens, output_tokens, cost)
+_usage_queue: "asyncio.Queue[Tuple[str, str, int, int, float]]" = asyncio.Queue()
+_usage_flusher: Optional[asyncio.Task] = None
+
+
+async def _write_usage(rows: List[Tuple[str, str, int, int, float]]) -> None:
+    try:
+        await db.log_api_usage_bulk(rows)
+    except Exception as e:
+        print(f"Failed to log {len(rows)} API usage rows: {e}")
+
+
+async def _flush_usage_forever() -> None:
+    """Write queued usage every USAGE_FLUSH_BATCH rows or USAGE_FLUSH_INTERVAL seconds"""
+    loop = asyncio.get_running_loop()
+    while True:
+        rows = [await _usage_queue.get()]
+        deadline = loop.time() + USAGE_FLUSH_INTERVAL
+        while len(rows) < USAGE_FLUSH_BATCH:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                rows.append(await asyncio.wait_for(_usage_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        await _write_usage(rows)
+
+
+def start_usage_flusher() -> None:
+    """Start the background api_usage writer (call on startup)"""
+    global _usage_flusher
+    if _usage_flusher is None:
+        _usage_flusher = asyncio.create_task(_flush_usage_forever())
+
+
+async def stop_usage_flusher() -> None:
+    """Stop the writer and flush whatever is still queued (call before closing the database)"""
+    global _usage_flusher
+    if _usage_flusher is not None:
+        _usage_flusher.cancel()
+        try:
+            await _usage_flusher
+        except asyncio.CancelledError:
+            pass
+        _usage_flusher = None
+
+    rows = []
+    while not _usage_queue.empty():
+        rows.append(_usage_queue.get_nowait())
+    if rows:
+        await _write_usage(rows)
 
 
 async def log_api_call(
     user_id: str,
     endpoint: str,
     input_tokens: int,
-    output_tokens: int
+    output_tokens: int,
+    cache_read_tokens: int = 0,
+    cache_write_tokens: int = 0
 ) -> None:
-    """Log API call for tracking and billing"""
-    cost = calculate_cost(input_tokens, output_tokens)
-
-    await db.log_api_usage(
-        user_id=user_id,
-        endpoint=endpoint,
-        input_tokens=input_tokens,
-        output_tokens=output_tokens,
-        cost=cost
-    )
+    """Log API call for tracking and billing (cached prompt tokens only affect cost)"""
+    cost = calculate_cost(input_tokens, output_tokens, cache_read_tokens, cache_write_tokens)
+
+    # Written in batches by the usage flusher
+    _usage_queue.put_nowait((user_id, endpoint, input_tokens, output_tokens, cost))
+
+    redis_client = get_redis()
+    if redis_client is not None:
+        _register_scripts(redis_client)
+        try:
+            await _record_usage_script(
+                keys=[_usage_key(user_id)],
+                args=[input_tokens, output_tokens, cost],
+                client=redis_client
+            )
+        except Exception as e:
+            print(f"Failed to record Redis usage for {user_id}: {e}")
 
 
 # Middleware for automatic rate limiting
 
+# The IP 429 response never varies: encode it once
+_IP_RATE_LIMITED_BODY = orjson.dumps({"detail": "Too many requests from your IP. Slow down."})
+_IP_RATE_LIMITED_START = {
+    "type": "http.response.start",
+    "status": 429,
+    "headers": [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(_IP_RATE_LIMITED_BODY)).encode()),
+    ],
+}
+_IP_RATE_LIMITED_BODY_MESSAGE = {"type": "http.response.body", "body": _IP_RATE_LIMITED_BODY}
+
 class RateLimitMiddleware:
     """
     FastAPI middleware for rate limiting
@@ -168,7 +560,7 @@ class RateLimitMiddleware:
 
     def __init__(self, app):
         self.app = app
-        self.ip_requests: Dict[str, list] = defaultdict(list)
+        self.ip_requests = ip_requests  # module-level so prune_request_windows can reach it
 
     async def __call__(self, scope, receive, send):
         if scope["type"] != "http":
@@ -187,32 +579,34 @@ class RateLimitMiddleware:
             client_ip = client[0] if client else "unknown"
 
         # Check IP-based rate limit (prevent abuse before auth)
-        now = time.time()
-        minute_ago = now - 60
-
-        requests = self.ip_requests[client_ip]
-        requests = [t for t in requests if t > minute_ago]
-        self.ip_requests[client_ip] = requests
-
-        if len(requests) >= MAX_REQUESTS_PER_MINUTE * 2:  # More lenient for IP-based
+        if not await self._allow(client_ip):
             # Send 429 response
-            response = {
-                "type": "http.response.start",
-                "status": 429,
-                "headers": [[b"content-type", b"application/json"]],
-            }
-            await send(response)
-            await send({
-                "type": "http.response.body",
-                "body": b'{"detail":"Too many requests from your IP. Slow down."}',
-            })
+            await send(_IP_RATE_LIMITED_START)
+            await send(_IP_RATE_LIMITED_BODY_MESSAGE)
             return
 
-        requests.append(now)
-
         # Continue with request
         await self.app(scope, receive, send)
 
+    async def _allow(self, client_ip: str) -> bool:
+        """Sliding-window IP check, shared across workers when Redis is up"""
+        max_requests = MAX_REQUESTS_PER_MINUTE * 2  # More lenient for IP-based
+
+        redis_client = get_redis()
+        if redis_client is not None:
+            _register_scripts(redis_client)
+            try:
+                allowed = await _sliding_window_script(
+                    keys=[f"rl:ip:{client_ip}"],
+                    args=[int(time.time() * 1000), 60_000, max_requests, uuid.uuid4().hex],
+                    client=redis_client
+                )
+                return allowed == 1
+            except Exception as e:
+                print(f"Redis IP rate limit check failed, using in-process limits: {e}")
+
+        return _window_allows(self.ip_requests, client_ip, max_requests)
+
 
 # Context manager for tracking API usage
 
@@ -231,6 +625,8 @@ class APIUsageTracker:
         self.endpoint = endpoint
         self.input_tokens = 0
         self.output_tokens = 0
+        self.cache_read_tokens = 0
+        self.cache_write_tokens = 0
 
     async def __aenter__(self):
         return self
@@ -241,13 +637,23 @@ class APIUsageTracker:
                 self.user_id,
                 self.endpoint,
                 self.input_tokens,
-                self.output_tokens
+                self.output_tokens,
+                self.cache_read_tokens,
+                self.cache_write_tokens
             )
 
-    def record(self, input_tokens: int, output_tokens: int):
+    def record(
+        self,
+        input_tokens: int,
+        output_tokens: int,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0
+    ):
         """Record token usage"""
         self.input_tokens = input_tokens
         self.output_tokens = output_tokens
+        self.cache_read_tokens = cache_read_tokens
+        self.cache_write_tokens = cache_write_tokens
 
 
 # Budget management
@@ -263,7 +669,7 @@ async def check_budget_available(user_id: str, estimated_input_tokens: int) -> b
     Returns:
         True if budget available, False otherwise
     """
-    usage = await db.get_user_api_usage_today(user_id)
+    usage = await get_usage_today(user_id)
     total_tokens = usage["input_tokens"] + usage["output_tokens"]
 
     # Estimate output tokens (typically 2-3x input for chat)
@@ -274,7 +680,7 @@ async def check_budget_available(user_id: str, estimated_input_tokens: int) -> b
 
 async def get_remaining_budget(user_id: str) -> Dict[str, any]:
     """Get user's remaining budget for today"""
-    usage = await db.get_user_api_usage_today(user_id)
+    usage = await get_usage_today(user_id)
 
     total_tokens = usage["input_tokens"] + usage["output_tokens"]
     total_cost = float(usage["total_cost"])
@@ -307,30 +713,15 @@ def truncate_to_budget(messages: list, max_tokens: int = 8000) -> list:
     if not messages:
         return messages
 
-    current_tokens = count_message_tokens(messages)
+    # Always keep system message if present
+    start = 1 if messages[0].get("role") == "system" else 0
 
-    if current_tokens <= max_tokens:
-        return messages
+    # Walk back from the newest message until the budget runs out; if it
+    # never does, the whole history fits and is returned untouched
+    running = 0
+    for i in range(len(messages) - 1, start - 1, -1):
+        running += estimate_tokens(messages[i].get("content", "")) + 4
+        if running > max_tokens:
+            return messages[:start] + messages[i + 1:]
 
-    # Always keep system message if present
-    result = []
-    if messages[0].get("role") == "system":
-        result.append(messages[0])
-        messages = messages[1:]
-
-    # Keep most recent messages
-    messages = list(reversed(messages))
-    current = 0
-
-    for msg in messages:
-        msg_tokens = estimate_tokens(msg.get("content", "")) + 4
-        if current + msg_tokens > max_tokens:
-            break
-        result.append(msg)
-        current += msg_tokens
-
-    # Reverse back to chronological order
-    if result and result[0].get("role") == "system":
-        return [result[0]] + list(reversed(result[1:]))
-    else:
-        return list(reversed(result))
+    return messages
@@ -0,0 +1,51 @@
+"""
+Shared Redis connection for FURG
+Cross-worker state (rate limits, usage counters); optional, callers fall back to in-process state
+"""
+
+import os
+from typing import Optional
+
+# Try to import Redis, fall back to in-process state
+try:
+    import redis.asyncio as redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+_redis: Optional["redis.Redis"] = None
+
+
+async def connect_redis() -> Optional["redis.Redis"]:
+    """Connect to REDIS_URL if configured and reachable"""
+    global _redis
+
+    redis_url = os.getenv("REDIS_URL")
+    if not (redis_url and REDIS_AVAILABLE):
+        print("Redis not configured, rate limits are per process")
+        return None
+
+    try:
+        client = redis.from_url(redis_url)
+        await client.ping()
+        _redis = client
+        print("Connected to Redis for rate limiting")
+    except Exception as e:
+        print(f"Redis connection failed, rate limits are per process: {e}")
+        _redis = None
+
+    return _redis
+
+
+async def close_redis():
+    """Close the shared Redis connection"""
+    global _redis
+    if _redis is not None:
+        await _redis.close()
+        _redis = None
+
+
+def get_redis() -> Optional["redis.Redis"]:
+    """Get the shared Redis client, or None when running without Redis"""
+    return _redis
@@ -3,12 +3,20 @@ Bill detection service for FURG
 Intelligently detects recurring bills from transaction history
 """
 
+import os
+import re
+import bisect
+import asyncio
 from datetime import datetime, timedelta
 from collections import defaultdict
+from functools import lru_cache
 from typing import List, Dict, Any, Optional
-import statistics
+
+import orjson
 
 from database import db
+from services.keywords import keyword_tagger, scan_tags
+from services.response_cache import response_cache
 
 
 # Merchant categories that typically indicate bills
@@ -33,6 +41,76 @@ SUBSCRIPTION_KEYWORDS = [
     "apple music", "youtube", "gym", "fitness", "subscription",
     "membership", "phone", "internet", "insurance", "loan"
 ]
+# Per-user caches, dropped by transaction syncs, bill detection and buffer
+# changes through response_cache.invalidate
+BILL_DETECTION_TTL = 900  # seconds
+SAFETY_BUFFER_TTL = 300
+
+# Common billing cycles as (cycle, tolerance) in days: weekly, bi-weekly,
+# monthly, bi-monthly, quarterly, semi-annual, annual
+BILLING_CYCLES = ((7, 1), (14, 2), (30, 3), (60, 5), (90, 7), (180, 10), (365, 15))
+# Cycle windows don't overlap, so sorted bounds allow one bisect per lookup
+_CYCLE_LOWS = tuple(cycle - tol for cycle, tol in BILLING_CYCLES)
+_CYCLE_HIGHS = tuple(cycle + tol for cycle, tol in BILLING_CYCLES)
+
+
+def _prefix_grouped_pattern(words) -> "re.Pattern":
+    """
+    Compile codes into one alternation, factored by their shared prefixes
+
+    Plaid codes share a few long prefixes (LOAN_PAYMENTS_, RENT_AND_UTILITIES_),
+    so each prefix is matched once and only the short suffixes branch.
+    """
+    groups = defaultdict(list)
+    for word in sorted(words):
+        groups[word.split("_", 1)[0]].append(word)
+
+    branches = []
+    for group in groups.values():
+        if len(group) == 1:
+            branches.append(re.escape(group[0]))
+            continue
+        prefix = os.path.commonprefix(group)
+        suffixes = "|".join(re.escape(word[len(prefix):]) for word in group)
+        branches.append(f"{re.escape(prefix)}(?:{suffixes})")
+    return re.compile("|".join(branches))
+
+
+_BILL_CATEGORY_RE = _prefix_grouped_pattern(BILL_CATEGORIES)
+
+# Keyword groups for merchant names and lowercased Plaid categories
+_MERCHANT_TAGGER = keyword_tagger({
+    "subscription": SUBSCRIPTION_KEYWORDS,
+    "insurance": ["insurance"],
+    "loan": ["loan"],
+    "telecom": ["phone", "internet", "cable", "mobile"],
+    "fitness": ["gym", "fitness"],
+    "entertainment": ["netflix", "spotify", "hulu", "disney", "prime"],
+})
+_PLAID_TAGGER = keyword_tagger({
+    "housing": ["rent", "mortgage"],
+    "utilities": ["utilities", "gas", "electric", "water"],
+    "insurance": ["insurance"],
+    "loan": ["loan"],
+})
+
+# Bill category rules in priority order: (category, Plaid tags, merchant tags);
+# the first rule sharing a tag with either side wins
+_BILL_CATEGORY_RULES = (
+    ("Housing", frozenset({"housing"}), frozenset()),
+    ("Utilities", frozenset({"utilities"}), frozenset()),
+    ("Insurance", frozenset({"insurance"}), frozenset({"insurance"})),
+    ("Loan", frozenset({"loan"}), frozenset({"loan"})),
+    ("Utilities", frozenset(), frozenset({"telecom"})),
+    ("Fitness", frozenset(), frozenset({"fitness"})),
+    ("Entertainment", frozenset(), frozenset({"entertainment"})),
+)
+
+
+@lru_cache(maxsize=256)
+def _plaid_tags(plaid_category: str) -> frozenset:
+    """Keyword tags for a Plaid category code (a small, repeating set)"""
+    return scan_tags(plaid_category.lower(), _PLAID_TAGGER)
 
 
 class BillDetector:
@@ -50,84 +128,118 @@ class BillDetector:
         Returns:
             List of detected bills
         """
-        # Get transaction history
-        start_date = datetime.now() - timedelta(days=days_lookback)
-        transactions = await db.get_transactions(
+        cache_key = response_cache.key(user_id, "bill_detection", "detect_bills", f"days_lookback={days_lookback}")
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            return orjson.loads(cached)
+
+        # Get transaction history (one clock read for both window ends)
+        now = datetime.now()
+        start_date = now - timedelta(days=days_lookback)
+        # Expenses only, already ordered by merchant then date
+        transactions = await db.get_expenses_by_merchant(
             user_id=user_id,
             start_date=start_date,
-            end_date=datetime.now(),
+            end_date=now,
             limit=1000
         )
 
-        # Group by merchant
-        by_merchant = defaultdict(list)
-        for txn in transactions:
-            # Only consider negative amounts (expenses)
-            if txn["amount"] < 0:
-                merchant = txn["merchant"].lower().strip()
-                by_merchant[merchant].append(txn)
-
         bills = []
+        stats = BillDetector._merchant_stats(transactions)
 
-        for merchant, txns in by_merchant.items():
+        for start, count, avg_amount, variation, avg_interval in stats:
             # Need at least 2 occurrences to detect pattern
-            if len(txns) < 2:
+            if count < 2:
                 continue
 
-            bill_data = BillDetector._analyze_merchant_pattern(merchant, txns)
+            txns = transactions[start:start + count]
+            bill_data = BillDetector._analyze_merchant_pattern(
+                txns[0]["merchant_key"], txns, avg_amount, variation, avg_interval
+            )
 
             if bill_data and bill_data["confidence"] > 0.5:
                 bills.append(bill_data)
 
-        # Save detected bills to database
-        for bill in bills:
-            await db.upsert_bill(user_id, bill)
+        # Save detected bills to database in one round trip
+        await db.upsert_bills(user_id, bills)
 
+        await response_cache.set(cache_key, orjson.dumps(bills), BILL_DETECTION_TTL)
         return bills
 
     @staticmethod
-    def _analyze_merchant_pattern(merchant: str, transactions: List[Dict]) -> Optional[Dict[str, Any]]:
+    def _merchant_stats(transactions: List[Dict]) -> List[tuple]:
         """
-        Analyze transactions for a single merchant to detect bill pattern
+        Amount and frequency statistics for every merchant in one pass
+
+        Welford's update keeps each merchant's mean and sample variance
+        without a second sweep over its amounts.
 
         Args:
-            merchant: Merchant name
-            transactions: List of transactions for this merchant
+            transactions: Expenses grouped by merchant_key, oldest first within a merchant
 
         Returns:
-            Bill data dict or None if not a bill
+            (start index, count, avg amount, coefficient of variation, avg interval days)
+            per merchant
         """
-        # Sort by date
-        transactions = sorted(transactions, key=lambda x: x["date"])
+        stats = []
+        start = 0
+        n = len(transactions)
+        while start < n:
+            key = transactions[start]["merchant_key"]
+            count = 0
+            mean = 0.0
+            m2 = 0.0
+            end = start
+            while end < n and transactions[end]["merchant_key"] == key:
+                count += 1
+                x = abs(float(transactions[end]["amount"]))
+                delta = x - mean
+                mean += delta / count
+                m2 += delta * (x - mean)
+                end += 1
+
+            if count > 1:
+                # Amount consistency: sample standard deviation over the mean
+                std_dev = (m2 / (count - 1)) ** 0.5
+                variation = std_dev / mean if mean > 0 else 1.0
+                # Frequency: the mean of consecutive gaps is (last - first) / gaps
+                span = transactions[end - 1]["date"].toordinal() - transactions[start]["date"].toordinal()
+                avg_interval = span / (count - 1)
+            else:
+                variation = 0.0
+                avg_interval = 0.0
+
+            stats.append((start, count, mean, variation, avg_interval))
+            start = end
+
+        return stats
 
-        # Analyze amount consistency
-        amounts = [abs(float(txn["amount"])) for txn in transactions]
-        avg_amount = statistics.mean(amounts)
-
-        if len(amounts) > 1:
-            std_dev = statistics.stdev(amounts)
-            coefficient_of_variation = std_dev / avg_amount if avg_amount > 0 else 1
-        else:
-            coefficient_of_variation = 0
-
-        # Analyze frequency
-        dates = [txn["date"] for txn in transactions]
-        intervals = []
-        for i in range(1, len(dates)):
-            interval = (dates[i] - dates[i-1]).days
-            intervals.append(interval)
-
-        if not intervals:
-            return None
+    @staticmethod
+    def _analyze_merchant_pattern(
+        merchant: str,
+        transactions: List[Dict],
+        avg_amount: float,
+        coefficient_of_variation: float,
+        avg_interval: float
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Score a single merchant's transactions as a bill pattern
 
-        avg_interval = statistics.mean(intervals)
+        Args:
+            merchant: Merchant name
+            transactions: List of transactions for this merchant, oldest first
+            avg_amount, coefficient_of_variation, avg_interval: from _merchant_stats
 
+        Returns:
+            Bill data dict or None if not a bill
+        """
         # Check merchant category
         category = transactions[0].get("merchant_category_code", "")
-        is_bill_category = any(bill_cat in category for bill_cat in BILL_CATEGORIES)
+        is_bill_category = _BILL_CATEGORY_RE.search(category) is not None
 
-        # Check for subscription keywords
-        is_subscription = any(keyword in merchant.lower() for keyword in SUBSCRIPTION_KEYWORDS)
+        # Scan the merchant name once for every keyword group
+        merchant_tags = scan_tags(merchant.lower(), _MERCHANT_TAGGER)
+        is_subscription = "subscription" in merchant_tags
 
         # Scoring logic
         is_bill = False
@@ -161,7 +273,7 @@ class BillDetector:
             return None
 
         # Predict next occurrence
-        last_date = dates[-1]
+        last_date = transactions[-1]["date"]
         frequency_days = int(round(avg_interval))
         next_due = last_date + timedelta(days=frequency_days)
 
@@ -171,7 +283,7 @@ class BillDetector:
             "frequency_days": frequency_days,
             "next_due_date": next_due.date(),
             "confidence": round(confidence, 2),
-            "category": BillDetector._categorize_bill(category, merchant),
+            "category": BillDetector._categorize_bill(category, merchant_tags),
             "bill_type": bill_type,
             "occurrences": len(transactions),
             "amount_variance": round(coefficient_of_variation, 2)
@@ -180,49 +292,18 @@ class BillDetector:
     @staticmethod
     def _is_regular_interval(days: float) -> bool:
         """Check if interval matches common billing cycles"""
-        # Weekly (7 days ±1)
-        if 6 <= days <= 8:
-            return True
-        # Bi-weekly (14 days ±2)
-        if 12 <= days <= 16:
-            return True
-        # Monthly (30 days ±3)
-        if 27 <= days <= 33:
-            return True
-        # Bi-monthly (60 days ±5)
-        if 55 <= days <= 65:
-            return True
-        # Quarterly (90 days ±7)
-        if 83 <= days <= 97:
-            return True
-        # Semi-annual (180 days ±10)
-        if 170 <= days <= 190:
-            return True
-        # Annual (365 days ±15)
-        if 350 <= days <= 380:
-            return True
-
-        return False
+        # Nearest cycle starting at or below days, then one upper-bound compare
+        i = bisect.bisect_right(_CYCLE_LOWS, days) - 1
+        return i >= 0 and days <= _CYCLE_HIGHS[i]
 
     @staticmethod
-    def _categorize_bill(plaid_category: str, merchant: str) -> str:
-        """Categorize bill type"""
-        merchant_lower = merchant.lower()
-
-        if any(word in plaid_category.lower() for word in ["rent", "mortgage"]):
-            return "Housing"
-        if any(word in plaid_category.lower() for word in ["utilities", "gas", "electric", "water"]):
-            return "Utilities"
-        if "insurance" in plaid_category.lower() or "insurance" in merchant_lower:
-            return "Insurance"
-        if "loan" in plaid_category.lower() or "loan" in merchant_lower:
-            return "Loan"
-        if any(word in merchant_lower for word in ["phone", "internet", "cable", "mobile"]):
-            return "Utilities"
-        if any(word in merchant_lower for word in ["gym", "fitness"]):
-            return "Fitness"
-        if any(word in merchant_lower for word in ["netflix", "spotify", "hulu", "disney", "prime"]):
-            return "Entertainment"
+    def _categorize_bill(plaid_category: str, merchant_tags: frozenset) -> str:
+        """Categorize bill type from the Plaid category and the merchant's keyword tags"""
+        plaid_tags = _plaid_tags(plaid_category)
+
+        for category, plaid_rule, merchant_rule in _BILL_CATEGORY_RULES:
+            if not (plaid_rule.isdisjoint(plaid_tags) and merchant_rule.isdisjoint(merchant_tags)):
+                return category
 
         return "Other"
 
@@ -274,17 +355,19 @@ class BillDetector:
         Returns:
             Minimum balance to maintain
         """
-        # Get upcoming bills (next 30 days)
-        upcoming_total = await db.calculate_upcoming_bills_total(user_id, 30)
+        cache_key = response_cache.key(user_id, "safety", "get_safety_buffer", "")
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            return orjson.loads(cached)
 
-        # Get user's emergency buffer setting
-        profile = await db.get_user_profile(user_id)
-        emergency_buffer = float(profile.get("emergency_buffer", 500)) if profile else 500
+        # Upcoming bills (next 30 days) and the user's emergency buffer setting
+        upcoming_total, emergency_buffer = await db.get_safety_buffer_inputs(user_id, 30)
 
         # Safety = 2× bills + emergency buffer
-        safety_buffer = (upcoming_total * 2) + emergency_buffer
+        safety_buffer = round((upcoming_total * 2) + emergency_buffer, 2)
 
-        return round(safety_buffer, 2)
+        await response_cache.set(cache_key, orjson.dumps(safety_buffer), SAFETY_BUFFER_TTL)
+        return safety_buffer
 
     @staticmethod
     async def can_hide_money(user_id: str, amount: float) -> Dict[str, Any]:
@@ -298,15 +381,14 @@ class BillDetector:
         Returns:
             Dict with can_hide bool and reasoning
         """
-        # Get current balance from Plaid
         from services.plaid_service import PlaidService
-        balance = await PlaidService.get_total_balance(user_id)
 
-        # Get safety buffer
-        safety_buffer = await BillDetector.get_safety_buffer(user_id)
-
-        # Get currently hidden amount
-        hidden = await db.get_total_hidden(user_id)
+        # Balance from Plaid, safety buffer and hidden amount are independent
+        balance, safety_buffer, hidden = await asyncio.gather(
+            PlaidService.get_total_balance(user_id),
+            BillDetector.get_safety_buffer(user_id),
+            db.get_total_hidden(user_id)
+        )
 
         # Calculate available after hiding
         available_after = balance - hidden - amount
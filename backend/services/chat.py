@@ -4,38 +4,166 @@ Handles conversation with Claude API and maintains roasting personality
 """
 
 import os
-from typing import List, Dict, Any, Optional
+import re
+import random
+import hashlib
+from functools import lru_cache
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 from datetime import datetime
 import anthropic
+import httpx
 
 from database import db
+from services.keywords import keyword_tagger, scan_tags
+from services.response_cache import response_cache
+from services.semantic_cache import semantic_cache
 from rate_limiter import APIUsageTracker, truncate_to_budget
-
-
-# Initialize Claude client
-client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-
-
-class ChatService:
-    """Service for handling chat conversations with FURG personality"""
-
-    @staticmethod
-    def build_system_prompt(
-        profile: Optional[Dict[str, Any]] = None,
-        context: Optional[Dict[str, Any]] = None
-    ) -> str:
-        """
-        Build system prompt with FURG's personality and user context
-
-        Args:
-            profile: User profile data
-            context: Additional context (recent transactions, bills, etc.)
-
-        Returns:
-            System prompt string
-        """
-        # Base personality
-        prompt = """You are FURG, a financial AI assistant with a roasting personality. Think of yourself as a brutally honest friend who genuinely cares about the user's financial future but isn't afraid to call out their BS.
+from ttl_map import TTLMap
+
+
+# One async Claude client per process: a chat round trip never holds a
+# thread, and turns reuse pooled HTTP/2 connections instead of paying a
+# TLS handshake each (beta header enables prompt caching on this SDK)
+_client: Optional[anthropic.AsyncAnthropic] = None
+
+
+def _get_client() -> anthropic.AsyncAnthropic:
+    """Get the shared Claude client, creating it on first use"""
+    global _client
+    if _client is None:
+        _client = anthropic.AsyncAnthropic(
+            api_key=os.getenv("ANTHROPIC_API_KEY"),
+            default_headers={"anthropic-beta": "prompt-caching-2024-07-31"},
+            timeout=httpx.Timeout(60.0, connect=5.0),
+            http_client=httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=100)
+            )
+        )
+    return _client
+
+# Every trigger phrase handle_command reacts to; most messages aren't
+# commands and are rejected with this single scan
+COMMAND_TRIGGER_RE = re.compile(
+    r"(?P<intensity>set intensity|intensity mode)|(?P<buffer>emergency buffer|safety buffer)",
+    re.IGNORECASE
+)
+COMMAND_AMOUNT_RE = re.compile(r'\$?(\d+(?:,\d{3})*(?:\.\d{2})?)')
+INTENSITY_MODE_RE = re.compile(r"insanity|mild|moderate", re.IGNORECASE)
+
+
+# Roast classes for lowercased merchant names and categories
+_RIDESHARE_KEYWORDS = frozenset(("uber", "lyft"))
+_DELIVERY_KEYWORDS = frozenset(("doordash", "grubhub", "ubereats", "postmates"))
+_COFFEE_KEYWORDS = frozenset(("starbucks", "coffee", "dunkin", "peet"))
+
+_ROAST_MERCHANT_TAGGER = keyword_tagger({
+    "uber_lyft": _RIDESHARE_KEYWORDS,
+    "food_delivery": _DELIVERY_KEYWORDS,
+    "coffee": _COFFEE_KEYWORDS,
+})
+_ROAST_CATEGORY_TAGGER = keyword_tagger({
+    "entertainment": frozenset(("entertainment", "streaming")),
+    "shopping": frozenset(("shopping", "retail")),
+    "subscriptions": frozenset(("subscription",)),
+})
+
+
+@lru_cache(maxsize=4096)
+def _merchant_roast_tags(merchant: str) -> frozenset:
+    """Roast classes for a merchant name (lowercased and scanned once per name)"""
+    return scan_tags(merchant.lower(), _ROAST_MERCHANT_TAGGER)
+
+
+@lru_cache(maxsize=256)
+def _category_roast_tags(category: str) -> frozenset:
+    """Roast classes for a transaction category (a small, repeating set)"""
+    return scan_tags(category.lower(), _ROAST_CATEGORY_TAGGER)
+
+# Roast templates by class; str.format placeholders so only the picked
+# one is rendered: amount, merchant, name, coffees (amount / $3), yearly
+_ROAST_TEMPLATE_GROUPS: Dict[str, Tuple[str, ...]] = {
+    "late_night": (
+        "${amount:.2f} at {merchant} at night? Tomorrow you will regret this.",
+        "Late night ${amount:.2f}? Impulse control has left the chat.",
+        "{name}, {merchant} at this hour? Your wallet is begging for sleep.",
+    ),
+    "uber_lyft": (
+        "${amount:.2f} on a ride? That's {coffees} coffees. Or, you know, walking money.",
+        "${amount:.2f} Uber? Your legs work, {name}. Use them.",
+        "At ${amount:.2f} per ride, you're basically their best customer. Congrats?",
+    ),
+    "food_delivery": (
+        "${amount:.2f} delivered? The walk to pick it up burns calories AND saves money.",
+        "DoorDash again? That's ${amount:.2f} for cold food and regret.",
+        "${amount:.2f} for delivery. Your kitchen is getting dusty and your wallet is getting light.",
+    ),
+    "coffee": (
+        "${amount:.2f} on coffee? That's ${yearly:.0f}/year if you do this daily. Insane.",
+        "At this rate, Starbucks should name a drink after you. The ${amount:.2f} Regret Latte.",
+        "Coffee for ${amount:.2f}? Your home has a coffee maker that's feeling very neglected.",
+    ),
+    "entertainment": (
+        "${amount:.2f} on entertainment? Hope the memories last because that money won't.",
+        "Entertainment budget: ${amount:.2f}. Entertainment value: questionable.",
+        "${amount:.2f} for fun. Remember this when you say you 'can't afford' your goals.",
+    ),
+    "shopping": (
+        "${amount:.2f} shopping trip? Did you need it or just want it? Be honest.",
+        "Another ${amount:.2f} gone. Your closet is full; your savings account isn't.",
+        "${amount:.2f} at {merchant}. Retail therapy only treats the symptoms, not the cause.",
+    ),
+    "subscriptions": (
+        "${amount:.2f}/month you'll forget about in 2 weeks. Classic.",
+        "Another subscription? You're collecting these like Pokemon. Gotta catch 'em all (except your savings goals).",
+    ),
+    "reasonable": (
+        "Reasonable purchase. I'm genuinely surprised.",
+        "Under budget? Who are you and what did you do with the real you?",
+        "Acceptable spending. The bar is low but you cleared it.",
+        "This one gets a pass. Don't let it go to your head.",
+    ),
+    "default": (
+        "${amount:.2f} at {merchant}. Not my worst nightmare, but not great either.",
+        "${amount:.2f} spent. Could've been worse. Could've been better.",
+        "{merchant} got ${amount:.2f} from you. Hope it was worth it.",
+    ),
+}
+
+
+def _flatten_templates(groups: Dict[str, Tuple[str, ...]]) -> Tuple[Tuple[str, ...], Dict[str, Tuple[int, int]]]:
+    """All templates in one tuple, plus each class's (start, count) run of it"""
+    templates: List[str] = []
+    runs = {}
+    for roast_class, group in groups.items():
+        runs[roast_class] = (len(templates), len(group))
+        templates.extend(group)
+    return tuple(templates), runs
+
+
+_ROAST_TEMPLATES, _ROAST_RUNS = _flatten_templates(_ROAST_TEMPLATE_GROUPS)
+
+_roast_rng = random.Random()
+
+
+def _pick_roast(roast_class: str, amount: float, merchant: str, name: str) -> str:
+    """Render one randomly picked template of a roast class"""
+    start, count = _ROAST_RUNS[roast_class]
+    return _ROAST_TEMPLATES[start + _roast_rng.randrange(count)].format(
+        amount=amount, merchant=merchant, name=name, coffees=int(amount / 3), yearly=amount * 365
+    )
+
+
+# Intensity replies in priority order when a message names several modes
+_INTENSITY_REPLIES = (
+    ("insanity", "Insanity mode activated. Hope you like being broke-but-rich. No mercy from now on."),
+    ("mild", "Mild mode set. I'll be gentle. (But you'll still hear about that $47 Uber.)"),
+    ("moderate", "Moderate mode locked in. Balanced roasting incoming."),
+)
+
+# FURG's personality: identical on every call, so it is sent as its own
+# system block and cached by Claude instead of reprocessed each turn
+FURG_PERSONALITY_PROMPT = """You are FURG, a financial AI assistant with a roasting personality. Think of yourself as a brutally honest friend who genuinely cares about the user's financial future but isn't afraid to call out their BS.
 
 ## Your Core Identity
 - Name: FURG (Financial Utility & Roasting Guide)
@@ -99,98 +227,225 @@ class ChatService:
 - Celebrate when hidden balance grows
 
 """
+FURG_PROMPT_CLOSING = """
+Remember: Your goal is to help users save money through tough love and smart protection of their financial safety."""
+INTENSITY_PROMPT_LINES = {
+    "insanity": "Intensity: INSANITY MODE - Maximum roasting, no mercy\n",
+    "moderate": "Intensity: Moderate - Balanced roasting and encouragement\n",
+    "mild": "Intensity: Mild - Gentle nudges, minimal roasting\n",
+}
+PROMPT_CACHE_CONTROL = {"type": "ephemeral"}
 
-        # Add user profile context
-        if profile:
-            prompt += "\n## User Profile\n"
+# Sliding window of recent history sent to Claude (six exchanges): older
+# turns rarely matter, and the profile/context prompt carries the rest.
+# A full window drops its oldest exchange every turn, so its prefix is
+# never sent again and gets no history cache breakpoint
+HISTORY_WINDOW_MESSAGES = 12
 
-            if profile.get("name"):
-                prompt += f"Name: {profile['name']}\n"
+# Token budget for history sent to Claude; the char-estimate pre-trim keeps
+# twice that so the precise count in truncate_to_budget has the final say
+HISTORY_TOKEN_BUDGET = 8000
+HISTORY_PREFILTER_TOKENS = 2 * HISTORY_TOKEN_BUDGET
 
-            if profile.get("location"):
-                prompt += f"Location: {profile['location']}\n"
+# Answers kept briefly for a message re-sent (refresh, retry) before
+# anything else was said; matched on the newest history messages
+REASK_TTL = 60  # seconds
+REASK_CACHE_MAX = 10000
+HISTORY_FINGERPRINT_LEN = 4
 
-            if profile.get("employer"):
-                prompt += f"Employer: {profile['employer']}\n"
+_reask_answers = TTLMap(REASK_CACHE_MAX)  # key -> answer
 
-            if profile.get("salary"):
-                prompt += f"Salary: ${profile['salary']:,.2f}/year\n"
 
-            if profile.get("savings_goal"):
-                goal = profile["savings_goal"]
-                prompt += f"Savings goal: ${goal.get('amount', 0):,.0f} by {goal.get('deadline', 'TBD')} for {goal.get('purpose', 'unspecified')}\n"
+def _reask_key(user_id: str, message: str, prompt_context: str, history_tail: List[Tuple[str, str]]) -> str:
+    """Idempotency key: user, message, prompt context and the history it follows"""
+    digest = hashlib.sha256()
+    for part in (user_id, message, prompt_context):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    for role, content in history_tail[-HISTORY_FINGERPRINT_LEN:]:
+        digest.update(role.encode())
+        digest.update(b"\0")
+        digest.update(content.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
 
-            if profile.get("intensity_mode"):
-                mode = profile["intensity_mode"]
-                if mode == "insanity":
-                    prompt += "Intensity: INSANITY MODE - Maximum roasting, no mercy\n"
-                elif mode == "moderate":
-                    prompt += "Intensity: Moderate - Balanced roasting and encouragement\n"
-                elif mode == "mild":
-                    prompt += "Intensity: Mild - Gentle nudges, minimal roasting\n"
 
-            if profile.get("learned_insights"):
-                prompt += f"\nLearned insights about user:\n"
-                for insight in profile["learned_insights"][:5]:  # Limit to most recent 5
-                    prompt += f"- {insight}\n"
+def _history_tail(history: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    return [(msg["role"], msg["content"]) for msg in history[-HISTORY_FINGERPRINT_LEN:]]
 
-        # Add real-time context
-        if context:
-            prompt += "\n## Current Context\n"
 
-            if context.get("balance"):
-                prompt += f"Current balance: ${context['balance']:,.2f}\n"
+def _answered_tail(history: List[Dict[str, Any]], message: str, answer: str) -> List[Tuple[str, str]]:
+    """History tail as it reads once this exchange is saved"""
+    return (_history_tail(history) + [("user", message), ("assistant", answer)])[-HISTORY_FINGERPRINT_LEN:]
 
-            if context.get("hidden_balance"):
-                prompt += f"Hidden balance: ${context['hidden_balance']:,.2f}\n"
 
-            if context.get("upcoming_bills"):
-                bills = context["upcoming_bills"]
-                prompt += f"Upcoming bills (30 days): ${bills.get('total', 0):,.2f}\n"
+def _remember_answer(user_id: str, message: str, prompt_context: str, history: List[Dict[str, Any]], answer: str):
+    """Key an answer by the history as it reads once the exchange is saved"""
+    tail = _answered_tail(history, message, answer)
+    _reask_answers.set(_reask_key(user_id, message, prompt_context, tail), answer, REASK_TTL)
 
-            if context.get("recent_transactions"):
-                prompt += f"\nRecent transactions (last 7 days):\n"
-                for txn in context["recent_transactions"][:10]:
-                    date = txn.get('date', '')
-                    if isinstance(date, datetime):
-                        date = date.strftime("%m/%d")
-                    prompt += f"- {date}: ${abs(txn.get('amount', 0)):.2f} at {txn.get('merchant', 'Unknown')}\n"
 
-            if context.get("spending_by_category"):
-                prompt += f"\nSpending this month by category:\n"
-                for cat, amount in context["spending_by_category"].items():
-                    prompt += f"- {cat}: ${amount:.2f}\n"
+def _profile_key(profile: Optional[Dict[str, Any]]) -> Optional[tuple]:
+    """Hashable snapshot of the profile fields the prompt uses"""
+    if not profile:
+        return None
 
-        prompt += """
-Remember: Your goal is to help users save money through tough love and smart protection of their financial safety."""
+    goal = profile.get("savings_goal")
+    if goal:
+        goal = (goal.get("amount", 0), goal.get("deadline", "TBD"), goal.get("purpose", "unspecified"))
+
+    insights = profile.get("learned_insights")
+    return (
+        profile.get("name"),
+        profile.get("location"),
+        profile.get("employer"),
+        profile.get("salary"),
+        goal or None,
+        profile.get("intensity_mode"),
+        tuple(insights[:5]) if insights else None,  # Limit to most recent 5
+    )
+
+
+def _context_key(context: Optional[Dict[str, Any]]) -> Optional[tuple]:
+    """Hashable snapshot of the context fields the prompt uses"""
+    if not context:
+        return None
+
+    bills = context.get("upcoming_bills")
+    transactions = context.get("recent_transactions")
+    if transactions:
+        transactions = tuple(
+            (txn.get("date", ""), txn.get("amount", 0), txn.get("merchant", "Unknown"))
+            for txn in transactions[:10]
+        )
+    by_category = context.get("spending_by_category")
+
+    return (
+        context.get("balance"),
+        context.get("hidden_balance"),
+        bills.get("total", 0) if bills else None,
+        transactions or None,
+        tuple(by_category.items()) if by_category else None,
+    )
+
+
+@lru_cache(maxsize=1024)
+def _build_prompt_cached(profile_key: Optional[tuple], context_key: Optional[tuple]) -> str:
+    """
+    Build the per-user prompt tail from profile/context snapshots
+
+    Consecutive turns usually carry the same profile and context, so the
+    text is built once per distinct snapshot.
+    """
+    # Sections are collected and joined once instead of re-concatenated
+    parts = []
+
+    # Add user profile context
+    if profile_key:
+        name, location, employer, salary, goal, intensity_mode, insights = profile_key
+        parts.append("\n## User Profile\n")
+
+        if name:
+            parts.append(f"Name: {name}\n")
+
+        if location:
+            parts.append(f"Location: {location}\n")
+
+        if employer:
+            parts.append(f"Employer: {employer}\n")
+
+        if salary:
+            parts.append(f"Salary: ${salary:,.2f}/year\n")
+
+        if goal:
+            amount, deadline, purpose = goal
+            parts.append(f"Savings goal: ${amount:,.0f} by {deadline} for {purpose}\n")
 
-        return prompt
+        intensity = INTENSITY_PROMPT_LINES.get(intensity_mode)
+        if intensity:
+            parts.append(intensity)
+
+        if insights:
+            parts.append("\nLearned insights about user:\n")
+            parts.extend(f"- {insight}\n" for insight in insights)
+
+    # Add real-time context
+    if context_key:
+        balance, hidden_balance, bills_total, transactions, by_category = context_key
+        parts.append("\n## Current Context\n")
+
+        if balance:
+            parts.append(f"Current balance: ${balance:,.2f}\n")
+
+        if hidden_balance:
+            parts.append(f"Hidden balance: ${hidden_balance:,.2f}\n")
+
+        if bills_total is not None:
+            parts.append(f"Upcoming bills (30 days): ${bills_total:,.2f}\n")
+
+        if transactions:
+            parts.append("\nRecent transactions (last 7 days):\n")
+            for date, amount, merchant in transactions:
+                if isinstance(date, datetime):
+                    date = date.strftime("%m/%d")
+                parts.append(f"- {date}: ${abs(amount):.2f} at {merchant}\n")
+
+        if by_category:
+            parts.append("\nSpending this month by category:\n")
+            parts.extend(f"- {cat}: ${amount:.2f}\n" for cat, amount in by_category)
+
+    parts.append(FURG_PROMPT_CLOSING)
+    return "".join(parts)
+
+
+class ChatService:
+    """Service for handling chat conversations with FURG personality"""
 
     @staticmethod
-    async def chat(
-        user_id: str,
-        message: str,
+    async def close():
+        """Close the shared Claude client"""
+        global _client
+        if _client is not None:
+            await _client.close()
+            _client = None
+
+    @staticmethod
+    def build_system_prompt(
         profile: Optional[Dict[str, Any]] = None,
         context: Optional[Dict[str, Any]] = None
-    ) -> Dict[str, Any]:
+    ) -> List[Dict[str, Any]]:
         """
-        Process a chat message and get FURG's response
+        Build system prompt with FURG's personality and user context
 
         Args:
-            user_id: User UUID
-            message: User's message
-            profile: User profile
-            context: Additional context
+            profile: User profile data
+            context: Additional context (recent transactions, bills, etc.)
 
         Returns:
-            Dict with response and metadata
+            System prompt blocks: the cached personality, then the per-user context
         """
-        # Load conversation history
-        history = await db.get_conversation_history(user_id, limit=50)
+        # Per-user tail; the personality block is FURG_PERSONALITY_PROMPT
+        prompt = _build_prompt_cached(_profile_key(profile), _context_key(context))
+
+        return [
+            {"type": "text", "text": FURG_PERSONALITY_PROMPT, "cache_control": PROMPT_CACHE_CONTROL},
+            {"type": "text", "text": prompt},
+        ]
+
+    @staticmethod
+    def _build_messages(history: List[Dict[str, Any]], message: str) -> List[Dict[str, Any]]:
+        """Conversation history plus the new message, truncated and cache-marked"""
+        # Rough pass on the 4-chars-per-token estimate, newest first: history
+        # well past the budget is dropped before anything is tokenized
+        approx = len(message) // 4 + 4
+        start = len(history)
+        while start > 0 and approx <= HISTORY_PREFILTER_TOKENS:
+            start -= 1
+            approx += len(history[start]["content"]) // 4 + 4
 
         # Build messages for Claude
         messages = []
-        for msg in history:
+        for msg in history[start:]:
             messages.append({
                 "role": msg["role"],
                 "content": msg["content"]
@@ -203,15 +458,81 @@ Remember: Your goal is to help users save money through tough love and smart pro
         })
 
         # Truncate to fit budget
-        messages = truncate_to_budget(messages, max_tokens=8000)
+        messages = truncate_to_budget(messages, max_tokens=HISTORY_TOKEN_BUDGET)
+
+        # Second cache breakpoint on the newest history message, so next
+        # turn reads this history back from the cache. Only worth the cache
+        # write while the history still starts where it did: once the window
+        # is full or the budget trimmed its front, the next turn's prefix
+        # differs and the write would never be read
+        complete = len(history) < HISTORY_WINDOW_MESSAGES and len(messages) == len(history) + 1
+        if complete and len(messages) > 1:
+            last_history = messages[-2]
+            messages[-2] = {
+                "role": last_history["role"],
+                "content": [{
+                    "type": "text",
+                    "text": last_history["content"],
+                    "cache_control": PROMPT_CACHE_CONTROL
+                }]
+            }
+
+        return messages
+
+    @staticmethod
+    async def chat(
+        user_id: str,
+        message: str,
+        profile: Optional[Dict[str, Any]] = None,
+        context: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Process a chat message and get FURG's response
+
+        Args:
+            user_id: User UUID
+            message: User's message
+            profile: User profile
+            context: Additional context
 
+        Returns:
+            Dict with response and metadata
+        """
         # Build system prompt
         system_prompt = ChatService.build_system_prompt(profile, context)
+        prompt_context = system_prompt[1]["text"]
+
+        # Load conversation history
+        history = await db.get_recent_messages(user_id, limit=HISTORY_WINDOW_MESSAGES)
+
+        # The same message re-sent right after it was answered: the
+        # exchange is already saved, so just return that answer again
+        tail = _history_tail(history)
+        answer = _reask_answers.get(_reask_key(user_id, message, prompt_context, tail))
+        if answer is not None:
+            return {
+                "message": answer,
+                "tokens_used": {"input": 0, "output": 0}
+            }
+
+        # A near-duplicate of a question just answered under the same
+        # profile, context and conversation tail gets the same answer
+        # without a Claude call
+        cached = semantic_cache.get(user_id, message, prompt_context, tail)
+        if cached is not None:
+            await db.save_messages(user_id, [("user", message), ("assistant", cached)])
+            _remember_answer(user_id, message, prompt_context, history, cached)
+            return {
+                "message": cached,
+                "tokens_used": {"input": 0, "output": 0}
+            }
+
+        messages = ChatService._build_messages(history, message)
 
         # Call Claude with usage tracking
         async with APIUsageTracker(user_id, "chat") as tracker:
             try:
-                response = client.messages.create(
+                response = await _get_client().messages.create(
                     model="claude-sonnet-4-20250514",
                     max_tokens=2000,
                     system=system_prompt,
@@ -220,15 +541,21 @@ Remember: Your goal is to help users save money through tough love and smart pro
 
                 response_text = response.content[0].text
 
-                # Track usage
+                # Track usage (cache fields are absent when caching didn't apply)
                 tracker.record(
                     response.usage.input_tokens,
-                    response.usage.output_tokens
+                    response.usage.output_tokens,
+                    getattr(response.usage, "cache_read_input_tokens", 0) or 0,
+                    getattr(response.usage, "cache_creation_input_tokens", 0) or 0
                 )
 
-                # Save messages to database
-                await db.save_message(user_id, "user", message)
-                await db.save_message(user_id, "assistant", response_text)
+                # Save both messages in one round trip
+                await db.save_messages(user_id, [("user", message), ("assistant", response_text)])
+                semantic_cache.set(
+                    user_id, message, prompt_context, response_text,
+                    _answered_tail(history, message, response_text)
+                )
+                _remember_answer(user_id, message, prompt_context, history, response_text)
 
                 return {
                     "message": response_text,
@@ -242,14 +569,101 @@ Remember: Your goal is to help users save money through tough love and smart pro
                 print(f"Claude API error: {e}")
                 # Fallback response
                 fallback = "Whoa, my roasting circuits are overloaded. Try again in a sec."
-                await db.save_message(user_id, "user", message)
-                await db.save_message(user_id, "assistant", fallback)
+                await db.save_messages(user_id, [("user", message), ("assistant", fallback)])
 
                 return {
                     "message": fallback,
                     "error": str(e)
                 }
 
+    @staticmethod
+    async def chat_stream(
+        user_id: str,
+        message: str,
+        profile: Optional[Dict[str, Any]] = None,
+        context: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process a chat message, yielding FURG's response as it is generated
+
+        Args:
+            user_id: User UUID
+            message: User's message
+            profile: User profile
+            context: Additional context
+
+        Yields:
+            {"delta": text} chunks, then one final dict shaped like chat()'s result
+        """
+        system_prompt = ChatService.build_system_prompt(profile, context)
+        prompt_context = system_prompt[1]["text"]
+        history = await db.get_recent_messages(user_id, limit=HISTORY_WINDOW_MESSAGES)
+
+        tail = _history_tail(history)
+        answer = _reask_answers.get(_reask_key(user_id, message, prompt_context, tail))
+        if answer is None:
+            answer = semantic_cache.get(user_id, message, prompt_context, tail)
+            if answer is not None:
+                await db.save_messages(user_id, [("user", message), ("assistant", answer)])
+                _remember_answer(user_id, message, prompt_context, history, answer)
+        if answer is not None:
+            yield {
+                "message": answer,
+                "tokens_used": {"input": 0, "output": 0}
+            }
+            return
+
+        messages = ChatService._build_messages(history, message)
+
+        async with APIUsageTracker(user_id, "chat") as tracker:
+            try:
+                async with _get_client().messages.stream(
+                    model="claude-sonnet-4-20250514",
+                    max_tokens=2000,
+                    system=system_prompt,
+                    messages=messages
+                ) as stream:
+                    async for text in stream.text_stream:
+                        yield {"delta": text}
+                    response = await stream.get_final_message()
+
+                response_text = response.content[0].text
+
+                # Track usage (cache fields are absent when caching didn't apply)
+                tracker.record(
+                    response.usage.input_tokens,
+                    response.usage.output_tokens,
+                    getattr(response.usage, "cache_read_input_tokens", 0) or 0,
+                    getattr(response.usage, "cache_creation_input_tokens", 0) or 0
+                )
+
+                # Save both messages in one round trip
+                await db.save_messages(user_id, [("user", message), ("assistant", response_text)])
+                semantic_cache.set(
+                    user_id, message, prompt_context, response_text,
+                    _answered_tail(history, message, response_text)
+                )
+                _remember_answer(user_id, message, prompt_context, history, response_text)
+
+                yield {
+                    "message": response_text,
+                    "tokens_used": {
+                        "input": response.usage.input_tokens,
+                        "output": response.usage.output_tokens
+                    }
+                }
+
+            except anthropic.APIError as e:
+                print(f"Claude API error: {e}")
+                # Fallback response (replaces any partial text already streamed)
+                fallback = "Whoa, my roasting circuits are overloaded. Try again in a sec."
+                await db.save_messages(user_id, [("user", message), ("assistant", fallback)])
+
+                yield {
+                    "message": fallback,
+                    "error": str(e)
+                }
+
     @staticmethod
     def generate_roast(transaction: Dict[str, Any], user_profile: Optional[Dict] = None) -> str:
         """
@@ -262,99 +676,47 @@ Remember: Your goal is to help users save money through tough love and smart pro
         Returns:
             Roast string
         """
-        import random
-
         amount = abs(float(transaction.get("amount", 0)))
         merchant = transaction.get("merchant", "Unknown")
         date = transaction.get("date", datetime.now())
-        category = transaction.get("category", "").lower()
+        category = transaction.get("category", "")
         name = user_profile.get("name", "friend") if user_profile else "friend"
 
-        # Roast templates by category
-        roast_templates = {
-            "late_night": [
-                f"${amount:.2f} at {merchant} at night? Tomorrow you will regret this.",
-                f"Late night ${amount:.2f}? Impulse control has left the chat.",
-                f"{name}, {merchant} at this hour? Your wallet is begging for sleep.",
-            ],
-            "uber_lyft": [
-                f"${amount:.2f} on a ride? That's {int(amount/3)} coffees. Or, you know, walking money.",
-                f"${amount:.2f} Uber? Your legs work, {name}. Use them.",
-                f"At ${amount:.2f} per ride, you're basically their best customer. Congrats?",
-            ],
-            "food_delivery": [
-                f"${amount:.2f} delivered? The walk to pick it up burns calories AND saves money.",
-                f"DoorDash again? That's ${amount:.2f} for cold food and regret.",
-                f"${amount:.2f} for delivery. Your kitchen is getting dusty and your wallet is getting light.",
-            ],
-            "coffee": [
-                f"${amount:.2f} on coffee? That's ${amount * 365:.0f}/year if you do this daily. Insane.",
-                f"At this rate, Starbucks should name a drink after you. The ${amount:.2f} Regret Latte.",
-                f"Coffee for ${amount:.2f}? Your home has a coffee maker that's feeling very neglected.",
-            ],
-            "entertainment": [
-                f"${amount:.2f} on entertainment? Hope the memories last because that money won't.",
-                f"Entertainment budget: ${amount:.2f}. Entertainment value: questionable.",
-                f"${amount:.2f} for fun. Remember this when you say you 'can't afford' your goals.",
-            ],
-            "shopping": [
-                f"${amount:.2f} shopping trip? Did you need it or just want it? Be honest.",
-                f"Another ${amount:.2f} gone. Your closet is full; your savings account isn't.",
-                f"${amount:.2f} at {merchant}. Retail therapy only treats the symptoms, not the cause.",
-            ],
-            "subscriptions": [
-                f"${amount:.2f}/month you'll forget about in 2 weeks. Classic.",
-                f"Another subscription? You're collecting these like Pokemon. Gotta catch 'em all (except your savings goals).",
-            ],
-            "reasonable": [
-                "Reasonable purchase. I'm genuinely surprised.",
-                "Under budget? Who are you and what did you do with the real you?",
-                "Acceptable spending. The bar is low but you cleared it.",
-                "This one gets a pass. Don't let it go to your head.",
-            ],
-            "default": [
-                f"${amount:.2f} at {merchant}. Not my worst nightmare, but not great either.",
-                f"${amount:.2f} spent. Could've been worse. Could've been better.",
-                f"{merchant} got ${amount:.2f} from you. Hope it was worth it.",
-            ],
-        }
-
         # Time-based roasts
         if isinstance(date, datetime):
             hour = date.hour
             if hour >= 22 or hour <= 4:
-                return random.choice(roast_templates["late_night"])
+                return _pick_roast("late_night", amount, merchant, name)
 
-        # Merchant-specific roasts
-        merchant_lower = merchant.lower()
+        # Merchant-specific roasts (one scan finds every matching class)
+        merchant_tags = _merchant_roast_tags(merchant)
 
-        if "uber" in merchant_lower or "lyft" in merchant_lower:
-            if amount > 25:
-                return random.choice(roast_templates["uber_lyft"])
+        if "uber_lyft" in merchant_tags and amount > 25:
+            return _pick_roast("uber_lyft", amount, merchant, name)
 
-        if any(x in merchant_lower for x in ["doordash", "grubhub", "ubereats", "postmates"]):
-            return random.choice(roast_templates["food_delivery"])
+        if "food_delivery" in merchant_tags:
+            return _pick_roast("food_delivery", amount, merchant, name)
 
-        if any(x in merchant_lower for x in ["starbucks", "coffee", "dunkin", "peet"]):
-            return random.choice(roast_templates["coffee"])
+        if "coffee" in merchant_tags:
+            return _pick_roast("coffee", amount, merchant, name)
 
         # Category-specific roasts
-        if "entertainment" in category or "streaming" in category:
-            if amount > 50:
-                return random.choice(roast_templates["entertainment"])
+        category_tags = _category_roast_tags(category)
+
+        if "entertainment" in category_tags and amount > 50:
+            return _pick_roast("entertainment", amount, merchant, name)
 
-        if "shopping" in category or "retail" in category:
-            if amount > 50:
-                return random.choice(roast_templates["shopping"])
+        if "shopping" in category_tags and amount > 50:
+            return _pick_roast("shopping", amount, merchant, name)
 
-        if "subscription" in category:
-            return random.choice(roast_templates["subscriptions"])
+        if "subscriptions" in category_tags:
+            return _pick_roast("subscriptions", amount, merchant, name)
 
         # Amount-based fallbacks
         if amount < 15:
-            return random.choice(roast_templates["reasonable"])
+            return _pick_roast("reasonable", amount, merchant, name)
 
-        return random.choice(roast_templates["default"])
+        return _pick_roast("default", amount, merchant, name)
 
     @staticmethod
     async def handle_command(user_id: str, message: str) -> Optional[str]:
@@ -368,27 +730,26 @@ Remember: Your goal is to help users save money through tough love and smart pro
         Returns:
             Command response or None if not a command
         """
-        message_lower = message.lower()
+        # One scan tells which commands the message triggers, if any
+        triggers = {match.lastgroup for match in COMMAND_TRIGGER_RE.finditer(message)}
+        if not triggers:
+            return None
 
         # Set intensity mode
-        if "set intensity" in message_lower or "intensity mode" in message_lower:
-            if "insanity" in message_lower:
-                await db.update_user_profile(user_id, {"intensity_mode": "insanity"})
-                return "Insanity mode activated. Hope you like being broke-but-rich. No mercy from now on."
-            elif "mild" in message_lower:
-                await db.update_user_profile(user_id, {"intensity_mode": "mild"})
-                return "Mild mode set. I'll be gentle. (But you'll still hear about that $47 Uber.)"
-            elif "moderate" in message_lower:
-                await db.update_user_profile(user_id, {"intensity_mode": "moderate"})
-                return "Moderate mode locked in. Balanced roasting incoming."
+        if "intensity" in triggers:
+            modes = {match.group().lower() for match in INTENSITY_MODE_RE.finditer(message)}
+            for mode, reply in _INTENSITY_REPLIES:
+                if mode in modes:
+                    await db.update_user_profile(user_id, {"intensity_mode": mode})
+                    return reply
 
         # Set emergency buffer
-        if "emergency buffer" in message_lower or "safety buffer" in message_lower:
-            import re
-            amounts = re.findall(r'\$?(\d+(?:,\d{3})*(?:\.\d{2})?)', message)
+        if "buffer" in triggers:
+            amounts = COMMAND_AMOUNT_RE.findall(message)
             if amounts:
                 amount = float(amounts[0].replace(',', ''))
                 await db.update_user_profile(user_id, {"emergency_buffer": amount})
+                await response_cache.invalidate(user_id, "safety")
                 return f"Done. ${amount:.2f} emergency cushion set. Anything else, your highness?"
 
         return None
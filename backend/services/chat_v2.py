@@ -12,14 +12,28 @@ Cost savings: ~94% vs pure Claude
 """
 
 import os
-from typing import List, Dict, Any, Optional
+import asyncio
+from typing import List, Dict, Any, Optional, Set
 from datetime import datetime
 
 from database import db
+from services.response_cache import response_cache
 from rate_limiter import APIUsageTracker, truncate_to_budget, calculate_cost
 from services.model_router import model_router, ModelResponse
 from services.context_cache import context_cache
 from services.gemini_service import ModelIntent
+from services.chat import COMMAND_TRIGGER_RE, COMMAND_AMOUNT_RE
+
+
+# Post-response analytics writes still running; held so they aren't garbage collected
+_pending_writes: Set[asyncio.Task] = set()
+
+
+def _write_in_background(coro) -> None:
+    """Run a write after the response is returned instead of before it"""
+    task = asyncio.create_task(coro)
+    _pending_writes.add(task)
+    task.add_done_callback(_pending_writes.discard)
 
 
 class ChatServiceV2:
@@ -42,6 +56,12 @@ class ChatServiceV2:
         """Initialize the chat service and dependencies"""
         await model_router.initialize()
 
+    @staticmethod
+    async def close():
+        """Wait for post-response writes still in flight"""
+        if _pending_writes:
+            await asyncio.gather(*_pending_writes, return_exceptions=True)
+
     @staticmethod
     async def chat(
         user_id: str,
@@ -53,6 +73,9 @@ class ChatServiceV2:
         """
         Process a chat message with intelligent model routing
 
+        Commands (intensity mode, emergency buffer) are answered by the
+        caller with handle_command before a message gets here.
+
         Args:
             user_id: User UUID
             message: User's message
@@ -63,25 +86,8 @@ class ChatServiceV2:
         Returns:
             Dict with response, model used, cost, and metadata
         """
-        # Handle special commands first (these don't need AI)
-        command_response = await ChatServiceV2.handle_command(user_id, message)
-        if command_response:
-            await db.save_message(user_id, "user", message)
-            await db.save_message(user_id, "assistant", command_response)
-            return {
-                "message": command_response,
-                "model": "command",
-                "intent": "command",
-                "tokens_used": {"input": 0, "output": 0, "cached": 0},
-                "cost": 0
-            }
-
         # Load conversation history
-        history = await db.get_conversation_history(user_id, limit=20)
-        conversation_history = [
-            {"role": msg["role"], "content": msg["content"]}
-            for msg in history
-        ]
+        conversation_history = await db.get_recent_messages(user_id, limit=20)
 
         # Build dynamic data from context
         dynamic_data = {
@@ -108,19 +114,18 @@ class ChatServiceV2:
                 # Track usage (use blended cost calculation)
                 tracker.record(response.input_tokens, response.output_tokens)
 
-                # Save messages to database
-                await db.save_message(user_id, "user", message)
-                await db.save_message(user_id, "assistant", response.content)
-
-                # Log routing decision for analytics
-                await ChatServiceV2._log_routing(
+                # Save the exchange before answering so the next message's
+                # history includes it (it may land on another worker); only
+                # the analytics log is left to finish after the response
+                await db.save_messages(user_id, [("user", message), ("assistant", response.content)])
+                _write_in_background(ChatServiceV2._log_routing(
                     user_id=user_id,
                     intent=response.intent.value,
                     model=response.model,
                     cost=response.cost,
                     latency_ms=response.latency_ms,
                     cached_tokens=response.cached_tokens
-                )
+                ))
 
                 return {
                     "message": response.content,
@@ -138,8 +143,7 @@ class ChatServiceV2:
             except Exception as e:
                 print(f"Chat error: {e}")
                 fallback = "Something went wrong on my end. Give me another shot?"
-                await db.save_message(user_id, "user", message)
-                await db.save_message(user_id, "assistant", fallback)
+                await db.save_messages(user_id, [("user", message), ("assistant", fallback)])
 
                 return {
                     "message": fallback,
@@ -163,6 +167,9 @@ class ChatServiceV2:
         Returns:
             Command response or None if not a command
         """
+        if not COMMAND_TRIGGER_RE.search(message):
+            return None
+
         message_lower = message.lower()
 
         # Set intensity mode
@@ -182,11 +189,11 @@ class ChatServiceV2:
 
         # Set emergency buffer
         if "emergency buffer" in message_lower or "safety buffer" in message_lower:
-            import re
-            amounts = re.findall(r'\$?(\d+(?:,\d{3})*(?:\.\d{2})?)', message)
+            amounts = COMMAND_AMOUNT_RE.findall(message)
             if amounts:
                 amount = float(amounts[0].replace(',', ''))
                 await db.update_user_profile(user_id, {"emergency_buffer": amount})
+                await response_cache.invalidate(user_id, "safety")
                 await context_cache.invalidate_on_profile_update(user_id)
                 return f"Emergency buffer set to ${amount:.2f}. Your money is protected."
 
@@ -13,7 +13,7 @@ import os
 import hashlib
 import hmac
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Optional, List, Dict, Any
 from urllib.parse import quote
 import httpx
@@ -235,7 +235,7 @@ class DealsService:
             return await DealsService._get_mock_products(keywords, max_price)
 
         # Make API request
-        now = datetime.utcnow()
+        now = datetime.now(timezone.utc)
         timestamp = now.strftime("%Y%m%dT%H%M%SZ")
         date = now.strftime("%Y%m%d")
 
@@ -301,7 +301,7 @@ class DealsService:
             "Marketplace": "www.amazon.com"
         }
 
-        now = datetime.utcnow()
+        now = datetime.now(timezone.utc)
         timestamp = now.strftime("%Y%m%dT%H%M%SZ")
         date = now.strftime("%Y%m%d")
 
@@ -824,7 +824,7 @@ class DealsPriceTracker:
             "current_price": product.price,
             "target_price": target_price,
             "image_url": product.image_url,
-            "tracked_at": datetime.utcnow().isoformat()
+            "tracked_at": datetime.now(timezone.utc).isoformat()
         }
 
         # Save to database if provided
@@ -0,0 +1,36 @@
+"""
+Keyword matching for FURG
+Compiled keyword scans shared by categorization, bill detection and roasting
+"""
+
+import re
+from typing import Collection, Dict, FrozenSet, Iterable, Mapping, Pattern, Tuple
+
+KeywordTagger = Tuple[Pattern, Dict[str, FrozenSet[str]]]
+
+
+def keyword_pattern(words: Iterable[str]) -> Pattern:
+    """Compile substrings into one alternation so a merchant is scanned once"""
+    return re.compile("|".join(map(re.escape, words)))
+
+
+def keyword_tagger(groups: Mapping[str, Collection[str]]) -> KeywordTagger:
+    """
+    Compile tagged keyword groups into one alternation plus a keyword -> tags map
+
+    Longer keywords are tried first, and a keyword also carries the tags of
+    any keyword it contains ("ubereats" is tagged for "uber" too), so a
+    single non-overlapping scan finds every tag.
+    """
+    keywords = sorted({word for words in groups.values() for word in words}, key=len, reverse=True)
+    tags = {
+        keyword: frozenset(tag for tag, words in groups.items() if any(word in keyword for word in words))
+        for keyword in keywords
+    }
+    return re.compile("|".join(map(re.escape, keywords))), tags
+
+
+def scan_tags(text: str, tagger: KeywordTagger) -> FrozenSet[str]:
+    """All tags whose keywords appear in text, in one pass"""
+    pattern, tags = tagger
+    return frozenset().union(*(tags[match.group()] for match in pattern.finditer(text)))
@@ -14,7 +14,7 @@ Cost Optimization:
 
 import os
 import asyncio
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from dataclasses import dataclass
 from datetime import datetime
 import anthropic
@@ -24,6 +24,70 @@ from services.grok_service import grok_service, GrokResponse
 from services.context_cache import context_cache, UserContext
 
 
+# Micro-batching of Gemini intent classification
+CHAT_BATCH_MAX = int(os.getenv("CHAT_BATCH_MAX", "8"))
+CHAT_BATCH_WAIT_MS = int(os.getenv("CHAT_BATCH_WAIT_MS", "15"))
+
+
+class RoutingBatcher:
+    """
+    Coalesces concurrent intent classifications into one Gemini call
+
+    A request waits at most CHAT_BATCH_WAIT_MS for others to join its
+    batch; a full batch (CHAT_BATCH_MAX) is sent immediately.
+    """
+
+    def __init__(self, max_batch: int = CHAT_BATCH_MAX, wait_ms: int = CHAT_BATCH_WAIT_MS):
+        self.max_batch = max(1, max_batch)
+        self.wait_seconds = wait_ms / 1000
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.Task] = None
+        self._dispatches: set = set()  # Keep references to in-flight batch tasks
+
+    async def classify(self, message: str) -> RouterResponse:
+        """Queue a message for classification and wait for its result"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((message, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_after_wait())
+
+        return await future
+
+    async def _flush_after_wait(self):
+        await asyncio.sleep(self.wait_seconds)
+        self._timer = None
+        self._flush()
+
+    def _flush(self):
+        """Send everything pending (in max_batch slices)"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._pending:
+            batch = self._pending[:self.max_batch]
+            self._pending = self._pending[self.max_batch:]
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future]]):
+        try:
+            results = await gemini_service.classify_intents([message for message, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
 @dataclass
 class ModelResponse:
     """Unified response from any model"""
@@ -69,6 +133,7 @@ class ModelRouter:
             api_key=os.getenv("ANTHROPIC_API_KEY")
         )
         self._use_local_heuristics = True  # Fast path for obvious intents
+        self.routing_batcher = RoutingBatcher()
 
     async def initialize(self):
         """Initialize services and caches"""
@@ -132,8 +197,8 @@ class ModelRouter:
                     reasoning="local heuristics"
                 )
 
-        # Fall back to Gemini for ambiguous cases
-        return await gemini_service.classify_intent(message)
+        # Fall back to Gemini for ambiguous cases (batched with concurrent requests)
+        return await self.routing_batcher.classify(message)
 
     async def route(
         self,
@@ -348,7 +413,7 @@ You provide thoughtful, nuanced financial advice. While you can be witty, your p
 
     def _build_claude_context(self, ctx: UserContext) -> str:
         """Build dynamic context for Claude"""
-        context = f"""
+        parts = [f"""
 ## User Profile
 Name: {ctx.name}
 Salary: ${ctx.salary:,.0f}/year
@@ -363,18 +428,17 @@ Today's spending: ${ctx.todays_spending:.2f}
 ## Life Context
 Stress level: {ctx.health.stress_level}
 Location mode: {ctx.location.mode}
-"""
+"""]
 
         if ctx.savings_goal:
             goal = ctx.savings_goal
-            context += f"\nSavings goal: ${goal.get('amount', 0):,.0f} for {goal.get('purpose', 'savings')}"
+            parts.append(f"\nSavings goal: ${goal.get('amount', 0):,.0f} for {goal.get('purpose', 'savings')}")
 
         if ctx.learned_insights:
-            context += "\n\nLearned about user:\n"
-            for insight in ctx.learned_insights[:3]:
-                context += f"- {insight}\n"
+            parts.append("\n\nLearned about user:\n")
+            parts.extend(f"- {insight}\n" for insight in ctx.learned_insights[:3])
 
-        return context
+        return "".join(parts)
 
     def _calculate_cost(
         self,
@@ -417,30 +417,31 @@ Remember: Your goal is to help users shop smarter, not just shop more."""
 
     def _build_system_prompt(self, context: Optional[Dict[str, Any]] = None) -> str:
         """Build system prompt with user context"""
-        prompt = self.SYSTEM_PROMPT
+        if not context:
+            return self.SYSTEM_PROMPT
 
-        if context:
-            prompt += "\n\n## User Context\n"
+        # Sections are collected and joined once instead of re-concatenated
+        parts = [self.SYSTEM_PROMPT, "\n\n## User Context\n"]
 
-            if context.get("shopping_list"):
-                items = context["shopping_list"][:5]
-                prompt += f"Shopping list ({len(items)} items):\n"
-                for item in items:
-                    prompt += f"- {item.get('name', 'Item')}"
-                    if item.get('target_price'):
-                        prompt += f" (target: ${item['target_price']:.2f})"
-                    prompt += "\n"
+        if context.get("shopping_list"):
+            items = context["shopping_list"][:5]
+            parts.append(f"Shopping list ({len(items)} items):\n")
+            for item in items:
+                parts.append(f"- {item.get('name', 'Item')}")
+                if item.get('target_price'):
+                    parts.append(f" (target: ${item['target_price']:.2f})")
+                parts.append("\n")
 
-            if context.get("budget"):
-                prompt += f"Monthly shopping budget: ${context['budget']:.2f}\n"
+        if context.get("budget"):
+            parts.append(f"Monthly shopping budget: ${context['budget']:.2f}\n")
 
-            if context.get("preferred_retailers"):
-                prompt += f"Preferred retailers: {', '.join(context['preferred_retailers'])}\n"
+        if context.get("preferred_retailers"):
+            parts.append(f"Preferred retailers: {', '.join(context['preferred_retailers'])}\n")
 
-            if context.get("credit_cards"):
-                prompt += f"Credit cards: {', '.join(context['credit_cards'])}\n"
+        if context.get("credit_cards"):
+            parts.append(f"Credit cards: {', '.join(context['credit_cards'])}\n")
 
-        return prompt
+        return "".join(parts)
 
     async def _execute_function(
         self,
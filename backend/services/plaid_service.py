@@ -4,20 +4,10 @@ Handles bank connections, transaction syncing, and account management
 """
 
 import os
+import asyncio
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
-import plaid
-from plaid.api import plaid_api
-from plaid.model.link_token_create_request import LinkTokenCreateRequest
-from plaid.model.link_token_create_request_user import LinkTokenCreateRequestUser
-from plaid.model.products import Products
-from plaid.model.country_code import CountryCode
-from plaid.model.item_public_token_exchange_request import ItemPublicTokenExchangeRequest
-from plaid.model.transactions_sync_request import TransactionsSyncRequest
-from plaid.model.transactions_get_request import TransactionsGetRequest
-from plaid.model.accounts_get_request import AccountsGetRequest
-from plaid.model.item_get_request import ItemGetRequest
-from plaid.model.institutions_get_by_id_request import InstitutionsGetByIdRequest
+import httpx
 from fastapi import HTTPException
 
 from database import db
@@ -27,30 +17,81 @@ from database import db
 PLAID_CLIENT_ID = os.getenv("PLAID_CLIENT_ID")
 PLAID_SECRET = os.getenv("PLAID_SECRET")
 PLAID_ENV = os.getenv("PLAID_ENV", "sandbox")  # sandbox, development, production
+PLAID_API_VERSION = "2020-09-14"
 
 # Map environment to Plaid host
 ENV_MAP = {
-    "sandbox": plaid.Environment.Sandbox,
-    "development": plaid.Environment.Development,
-    "production": plaid.Environment.Production,
+    "sandbox": "https://sandbox.plaid.com",
+    "development": "https://development.plaid.com",
+    "production": "https://production.plaid.com",
 }
 
-# Configure Plaid client
-configuration = plaid.Configuration(
-    host=ENV_MAP.get(PLAID_ENV, plaid.Environment.Sandbox),
-    api_key={
-        "clientId": PLAID_CLIENT_ID,
-        "secret": PLAID_SECRET,
-    }
-)
+# Shared HTTP/2 client, opened in the app lifespan and reused by every call
+_http_client: Optional[httpx.AsyncClient] = None
 
-api_client = plaid.ApiClient(configuration)
-client = plaid_api.PlaidApi(api_client)
+
+class PlaidAPIError(Exception):
+    """Error returned by the Plaid API (or the connection to it)"""
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Get the shared Plaid client, creating it on first use"""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            base_url=ENV_MAP.get(PLAID_ENV, ENV_MAP["sandbox"]),
+            http2=True,
+            timeout=30.0,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+            headers={"Plaid-Version": PLAID_API_VERSION}
+        )
+    return _http_client
+
+
+async def _plaid_post(path: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    """POST to a Plaid endpoint with client credentials and return the JSON body"""
+    payload = {"client_id": PLAID_CLIENT_ID, "secret": PLAID_SECRET, **body}
+
+    try:
+        response = await _get_client().post(path, json=payload)
+    except httpx.HTTPError as e:
+        raise PlaidAPIError(f"{path}: {e}") from e
+
+    if response.status_code >= 400:
+        # Plaid errors are JSON; a proxy or outage page may send anything
+        try:
+            error = response.json()
+        except ValueError:
+            error = None
+        if not isinstance(error, dict):
+            raise PlaidAPIError(f"{path}: HTTP {response.status_code}: {response.text[:200]!r}")
+        raise PlaidAPIError(
+            f"{error.get('error_code', response.status_code)}: "
+            f"{error.get('error_message', response.text)}"
+        )
+
+    try:
+        return response.json()
+    except ValueError:
+        raise PlaidAPIError(f"{path}: invalid JSON body: {response.text[:200]!r}") from None
 
 
 class PlaidService:
     """Service for Plaid operations"""
 
+    @staticmethod
+    async def initialize():
+        """Open the shared Plaid HTTP client"""
+        _get_client()
+
+    @staticmethod
+    async def close():
+        """Close the shared Plaid HTTP client"""
+        global _http_client
+        if _http_client is not None:
+            await _http_client.aclose()
+            _http_client = None
+
     @staticmethod
     async def create_link_token(user_id: str) -> str:
         """
@@ -63,19 +104,17 @@ class PlaidService:
             Link token string
         """
         try:
-            request = LinkTokenCreateRequest(
-                user=LinkTokenCreateRequestUser(client_user_id=user_id),
-                client_name="Furg - Your Roasting Financial AI",
-                products=[Products("transactions")],
-                country_codes=[CountryCode("US")],
-                language="en",
-                webhook="https://api.furg.app/webhooks/plaid",  # Update with actual webhook URL
-            )
-
-            response = client.link_token_create(request)
+            response = await _plaid_post("/link/token/create", {
+                "user": {"client_user_id": user_id},
+                "client_name": "Furg - Your Roasting Financial AI",
+                "products": ["transactions"],
+                "country_codes": ["US"],
+                "language": "en",
+                "webhook": "https://api.furg.app/webhooks/plaid",  # Update with actual webhook URL
+            })
             return response["link_token"]
 
-        except plaid.ApiException as e:
+        except PlaidAPIError as e:
             raise HTTPException(
                 status_code=500,
                 detail=f"Failed to create Plaid link token: {e}"
@@ -95,23 +134,23 @@ class PlaidService:
         """
         try:
             # Exchange token
-            exchange_request = ItemPublicTokenExchangeRequest(public_token=public_token)
-            exchange_response = client.item_public_token_exchange(exchange_request)
+            exchange_response = await _plaid_post(
+                "/item/public_token/exchange",
+                {"public_token": public_token}
+            )
 
             access_token = exchange_response["access_token"]
             item_id = exchange_response["item_id"]
 
             # Get item details
-            item_request = ItemGetRequest(access_token=access_token)
-            item_response = client.item_get(item_request)
+            item_response = await _plaid_post("/item/get", {"access_token": access_token})
             institution_id = item_response["item"]["institution_id"]
 
             # Get institution name
-            institution_request = InstitutionsGetByIdRequest(
-                institution_id=institution_id,
-                country_codes=[CountryCode("US")]
-            )
-            institution_response = client.institutions_get_by_id(institution_request)
+            institution_response = await _plaid_post("/institutions/get_by_id", {
+                "institution_id": institution_id,
+                "country_codes": ["US"]
+            })
             institution_name = institution_response["institution"]["name"]
 
             # Save to database
@@ -129,7 +168,7 @@ class PlaidService:
                 "institution_id": institution_id
             }
 
-        except plaid.ApiException as e:
+        except PlaidAPIError as e:
             raise HTTPException(
                 status_code=500,
                 detail=f"Failed to exchange token: {e}"
@@ -160,13 +199,11 @@ class PlaidService:
             start_date = (datetime.now() - timedelta(days=90)).date()
             end_date = datetime.now().date()
 
-            request = TransactionsGetRequest(
-                access_token=access_token,
-                start_date=start_date,
-                end_date=end_date
-            )
-
-            response = client.transactions_get(request)
+            response = await _plaid_post("/transactions/get", {
+                "access_token": access_token,
+                "start_date": start_date.isoformat(),
+                "end_date": end_date.isoformat()
+            })
             transactions = response["transactions"]
 
             # Process and save transactions
@@ -178,7 +215,7 @@ class PlaidService:
                     "date": datetime.strptime(txn["date"], "%Y-%m-%d"),
                     "amount": float(txn["amount"]) * -1,  # Plaid uses positive for debit
                     "merchant": txn["name"],
-                    "merchant_category_code": txn.get("personal_finance_category", {}).get("primary", ""),
+                    "merchant_category_code": (txn.get("personal_finance_category") or {}).get("primary", ""),
                     "category": None,  # Will be categorized by ML
                     "is_recurring": txn.get("transaction_type") == "recurring",
                 }
@@ -197,7 +234,7 @@ class PlaidService:
                 "end_date": str(end_date)
             }
 
-        except plaid.ApiException as e:
+        except PlaidAPIError as e:
             raise HTTPException(
                 status_code=500,
                 detail=f"Failed to sync transactions: {e}"
@@ -220,8 +257,10 @@ class PlaidService:
             if not plaid_item:
                 raise HTTPException(404, "Plaid item not found")
 
-            request = AccountsGetRequest(access_token=plaid_item["plaid_access_token"])
-            response = client.accounts_get(request)
+            response = await _plaid_post(
+                "/accounts/get",
+                {"access_token": plaid_item["plaid_access_token"]}
+            )
 
             accounts = []
             for account in response["accounts"]:
@@ -241,7 +280,7 @@ class PlaidService:
 
             return accounts
 
-        except plaid.ApiException as e:
+        except PlaidAPIError as e:
             raise HTTPException(
                 status_code=500,
                 detail=f"Failed to get accounts: {e}"
@@ -259,23 +298,30 @@ class PlaidService:
             Total balance
         """
         plaid_items = await db.get_plaid_items(user_id)
-        total = 0.0
 
-        for item in plaid_items:
-            try:
-                request = AccountsGetRequest(access_token=item["plaid_access_token"])
-                response = client.accounts_get(request)
-
-                for account in response["accounts"]:
-                    # Only count checking and savings accounts
-                    if account["type"] in ["depository"]:
-                        current_balance = account["balances"].get("current", 0)
-                        if current_balance:
-                            total += float(current_balance)
-
-            except plaid.ApiException as e:
-                print(f"Warning: Failed to get balance for item {item['plaid_item_id']}: {e}")
+        # One request per bank, multiplexed over the shared connection
+        responses = await asyncio.gather(
+            *(
+                _plaid_post("/accounts/get", {"access_token": item["plaid_access_token"]})
+                for item in plaid_items
+            ),
+            return_exceptions=True
+        )
+
+        total = 0.0
+        for item, response in zip(plaid_items, responses):
+            if isinstance(response, PlaidAPIError):
+                print(f"Warning: Failed to get balance for item {item['plaid_item_id']}: {response}")
                 continue
+            if isinstance(response, BaseException):
+                raise response
+
+            for account in response["accounts"]:
+                # Only count checking and savings accounts
+                if account["type"] in ["depository"]:
+                    current_balance = account["balances"].get("current", 0)
+                    if current_balance:
+                        total += float(current_balance)
 
         return total
 
@@ -0,0 +1,174 @@
+"""
+Response caching for FURG
+Short-lived per-user cache for read-only GET endpoints
+"""
+
+import os
+from decimal import Decimal
+from functools import wraps
+from typing import Any, Callable, Optional
+
+import orjson
+from fastapi.responses import Response
+
+from ttl_map import TTLMap
+
+# Try to import Redis, fall back to in-memory cache
+try:
+    import redis.asyncio as redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+def _json_default(value: Any) -> Any:
+    """Encode types orjson doesn't handle natively (asyncpg NUMERIC -> Decimal)"""
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+# Drop every key listed in each per-user group index, then the indexes,
+# so invalidation is one round trip however many groups a write touches
+#   KEYS: group index sets
+INVALIDATE_GROUPS_LUA = """
+for _, index in ipairs(KEYS) do
+    for _, key in ipairs(redis.call('SMEMBERS', index)) do
+        redis.call('DEL', key)
+    end
+    redis.call('DEL', index)
+end
+return 0
+"""
+
+
+class ResponseCache:
+    """
+    TTL cache of serialized GET responses, keyed by user and endpoint group
+
+    Entries live for a few seconds; mutating endpoints drop a user's
+    entries for the groups they touch via invalidate(). In Redis each
+    user's group keeps a set of its keys, so invalidation never scans
+    the keyspace.
+    """
+
+    DEFAULT_TTL = 15        # seconds
+    MAX_MEMORY_ENTRIES = 10000
+    INDEX_TTL = 3600        # seconds, outlives every entry it lists
+
+    def __init__(self):
+        self.redis_client: Optional["redis.Redis"] = None
+        self._memory_cache = TTLMap(self.MAX_MEMORY_ENTRIES)  # key -> body
+        self._invalidate_script = None
+
+    async def connect(self):
+        """Connect to Redis if available so all workers share the cache"""
+        redis_url = os.getenv("REDIS_URL")
+        if redis_url and REDIS_AVAILABLE:
+            try:
+                self.redis_client = redis.from_url(redis_url)
+                await self.redis_client.ping()
+                self._invalidate_script = self.redis_client.register_script(INVALIDATE_GROUPS_LUA)
+                print("Connected to Redis for response caching")
+            except Exception as e:
+                print(f"Redis connection failed, using in-memory response cache: {e}")
+                self.redis_client = None
+
+    def _group_prefix(self, user_id: str, group: str) -> str:
+        return f"resp:{user_id}:{group}:"
+
+    def _index_key(self, user_id: str, group: str) -> str:
+        return f"resp:idx:{user_id}:{group}"
+
+    def key(self, user_id: str, group: str, endpoint: str, params: str) -> str:
+        """Generate cache key"""
+        return f"{self._group_prefix(user_id, group)}{endpoint}?{params}"
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Get a cached body (Redis or memory)"""
+        if self.redis_client:
+            try:
+                return await self.redis_client.get(key)
+            except Exception:
+                pass
+
+        return self._memory_cache.get(key)
+
+    async def set(self, key: str, body: bytes, ttl: int):
+        """Cache a body with TTL"""
+        if self.redis_client:
+            # key() built this as resp:<user_id>:<group>:<endpoint>?<params>
+            _, user_id, group, _ = key.split(":", 3)
+            index = self._index_key(user_id, group)
+            try:
+                async with self.redis_client.pipeline(transaction=True) as pipe:
+                    pipe.setex(key, ttl, body)
+                    pipe.sadd(index, key)
+                    pipe.expire(index, max(ttl, self.INDEX_TTL))
+                    await pipe.execute()
+                return
+            except Exception:
+                pass
+
+        self._memory_cache.set(key, body, ttl)
+
+    async def invalidate(self, user_id: str, *groups: str):
+        """Drop a user's cached responses for the given endpoint groups"""
+        if self.redis_client and groups:
+            try:
+                await self._invalidate_script(
+                    keys=[self._index_key(user_id, group) for group in groups],
+                    client=self.redis_client
+                )
+            except Exception:
+                pass
+
+        for group in groups:
+            prefix = self._group_prefix(user_id, group)
+            for key in [k for k in self._memory_cache if k.startswith(prefix)]:
+                self._memory_cache.pop(key)
+
+
+# Global cache instance
+response_cache = ResponseCache()
+
+
+def cached_response(group: str, ttl: int = ResponseCache.DEFAULT_TTL) -> Callable:
+    """
+    Decorator caching a GET endpoint's JSON body per user
+
+    The key is the endpoint plus its query/path parameters; `user_id` must
+    be one of the endpoint's keyword arguments.
+
+    Usage:
+        @app.get("/api/v1/goals")
+        @cached_response("goals", ttl=30)
+        async def get_goals(user_id: str = Depends(get_current_user)):
+            ...
+    """
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            user_id = kwargs.get("user_id")
+            if not user_id:
+                return await func(*args, **kwargs)
+
+            params = "&".join(
+                f"{name}={value}"
+                for name, value in sorted(kwargs.items())
+                if name not in ("user_id", "now")
+            )
+            key = response_cache.key(user_id, group, func.__name__, params)
+
+            body = await response_cache.get(key)
+            if body is None:
+                result = await func(*args, **kwargs)
+                if isinstance(result, Response):
+                    return result
+                body = orjson.dumps(result, default=_json_default)
+                await response_cache.set(key, body, ttl)
+
+            return Response(content=body, media_type="application/json")
+
+        return wrapper
+    return decorator
@@ -0,0 +1,123 @@
+"""
+Semantic response cache for FURG
+Answers near-duplicate chat questions from a short-lived per-user cache
+"""
+
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+EMBEDDING_DIM = 1024
+SIMILARITY_THRESHOLD = 0.95
+SEMANTIC_CACHE_TTL = 300       # seconds, matches Claude's prompt cache lifetime
+MAX_ENTRIES_PER_USER = 32
+MAX_USERS = 10000
+
+_WORD_RE = re.compile(r"[a-z0-9$]+")
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+def embed(text: str) -> np.ndarray:
+    """
+    Unit vector of hashed word and character-trigram counts
+
+    Cheap local stand-in for a sentence embedding: rewordings that share
+    most words and spelling land close together, different questions don't.
+    """
+    normalized = " ".join(_WORD_RE.findall(text.lower().replace("'", "")))
+    features = normalized.split()
+    features.extend(normalized[i:i + 3] for i in range(len(normalized) - 2))
+
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    if not features:
+        return vector
+
+    buckets = np.fromiter((hash(f) % EMBEDDING_DIM for f in features), dtype=np.intp, count=len(features))
+    np.add.at(vector, buckets, 1.0)
+    vector /= np.linalg.norm(vector)
+    return vector
+
+
+class SemanticCache:
+    """
+    Per-process cache of recent chat answers, matched by cosine similarity
+
+    An entry only matches while the prompt context it was answered under
+    is unchanged, so a new balance or transaction forces a fresh answer,
+    only for a message quoting the same numbers ("$50" vs "$500"), and
+    only right after the same conversation tail, so a short follow-up
+    ("why?", "are you sure?") never gets an answer from an earlier topic.
+    """
+
+    def __init__(self):
+        # user_id -> (embedding, scope, response, expiry), oldest first
+        self._entries: "OrderedDict[str, Deque[Tuple[np.ndarray, tuple, str, float]]]" = OrderedDict()
+
+    @staticmethod
+    def _scope(message: str, context: str, history: Sequence[Tuple[str, str]]) -> tuple:
+        return context, tuple(_NUMBER_RE.findall(message)), tuple(history)
+
+    def get(
+        self,
+        user_id: str,
+        message: str,
+        context: str,
+        history: Sequence[Tuple[str, str]] = ()
+    ) -> Optional[str]:
+        """Cached response to a near-identical message under the same context and history"""
+        entries = self._entries.get(user_id)
+        if not entries:
+            return None
+
+        now = time.monotonic()
+        while entries and entries[0][3] <= now:
+            entries.popleft()
+
+        scope = self._scope(message, context, history)
+        candidates = [entry for entry in entries if entry[1] == scope]
+        if not candidates:
+            return None
+
+        similarities = np.stack([entry[0] for entry in candidates]) @ embed(message)
+        best = int(np.argmax(similarities))
+        if similarities[best] < SIMILARITY_THRESHOLD:
+            return None
+
+        self._entries.move_to_end(user_id)
+        return candidates[best][2]
+
+    def set(
+        self,
+        user_id: str,
+        message: str,
+        context: str,
+        response: str,
+        history: Sequence[Tuple[str, str]] = ()
+    ):
+        """
+        Remember a response for SEMANTIC_CACHE_TTL seconds
+
+        history is the (role, content) tail a later message must follow
+        for this response to be reused.
+        """
+        entries = self._entries.get(user_id)
+        if entries is None:
+            if len(self._entries) >= MAX_USERS:
+                self._entries.popitem(last=False)
+            entries = self._entries[user_id] = deque(maxlen=MAX_ENTRIES_PER_USER)
+        else:
+            self._entries.move_to_end(user_id)
+
+        entries.append((embed(message), self._scope(message, context, history), response, time.monotonic() + SEMANTIC_CACHE_TTL))
+
+    def invalidate(self, user_id: str):
+        """Forget a user's cached responses"""
+        self._entries.pop(user_id, None)
+
+
+# Global cache instance
+semantic_cache = SemanticCache()
@@ -0,0 +1,14 @@
+import os
+import sys
+
+import fakeredis
+import pytest
+
+# Tests import the backend modules the way main.py does (from backend/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fake_redis():
+    """In-memory Redis that also runs the Lua scripts"""
+    return fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer())
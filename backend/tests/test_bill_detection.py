@@ -0,0 +1,79 @@
+import random
+import statistics
+from datetime import datetime, timedelta
+
+import pytest
+
+from services.bill_detection import BillDetector
+
+
+def _history(rng, merchants):
+    """Random expenses grouped by merchant, oldest first within each"""
+    transactions = []
+    for m in range(merchants):
+        date = datetime(2024, 1, 1) + timedelta(days=rng.randint(0, 30))
+        for _ in range(rng.randint(1, 12)):
+            transactions.append({
+                "merchant_key": f"merchant {m}",
+                "amount": -round(rng.choice([rng.uniform(1, 500), 9.99, 0.0]), 2),
+                "date": date,
+            })
+            date += timedelta(days=rng.randint(1, 45))
+    return transactions
+
+
+def _reference_stats(transactions):
+    """The same statistics computed merchant by merchant with the statistics module"""
+    stats = []
+    start = 0
+    while start < len(transactions):
+        key = transactions[start]["merchant_key"]
+        end = start
+        while end < len(transactions) and transactions[end]["merchant_key"] == key:
+            end += 1
+        txns = transactions[start:end]
+        amounts = [abs(t["amount"]) for t in txns]
+        mean = statistics.fmean(amounts)
+        if len(txns) > 1:
+            variation = statistics.stdev(amounts) / mean if mean > 0 else 1.0
+            avg_interval = (txns[-1]["date"] - txns[0]["date"]).days / (len(txns) - 1)
+        else:
+            variation = 0.0
+            avg_interval = 0.0
+        stats.append((start, len(txns), mean, variation, avg_interval))
+        start = end
+    return stats
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_merchant_stats_match_reference(seed):
+    rng = random.Random(seed)
+    transactions = _history(rng, merchants=rng.randint(1, 40))
+
+    stats = BillDetector._merchant_stats(transactions)
+
+    expected = _reference_stats(transactions)
+    assert [row[:2] for row in stats] == [row[:2] for row in expected]
+    for row, ref in zip(stats, expected):
+        assert row[2:] == pytest.approx(ref[2:], rel=1e-9, abs=1e-9)
+
+
+def test_merchant_stats_empty():
+    assert BillDetector._merchant_stats([]) == []
+
+
+@pytest.mark.parametrize("variation, interval, expected", [
+    (0.01, 30, 0.75),     # very consistent
+    (0.10, 30, 0.6),      # somewhat consistent
+    (0.10, 19, None),     # irregular interval
+    (0.30, 30, None),     # inconsistent amounts
+])
+def test_recurring_confidence_tiers(variation, interval, expected):
+    transactions = [
+        {"merchant": "Green Lawn Care", "amount": -40.0, "date": datetime(2024, 1, 1)},
+        {"merchant": "Green Lawn Care", "amount": -40.0, "date": datetime(2024, 1, 1) + timedelta(days=interval)},
+    ]
+
+    bill = BillDetector._analyze_merchant_pattern("green lawn care", transactions, 40.0, variation, interval)
+
+    assert (bill and bill["confidence"]) == expected
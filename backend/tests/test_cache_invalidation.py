@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import main  # noqa: E402
+from services.response_cache import response_cache  # noqa: E402
+
+
+@pytest.fixture
+def goals(monkeypatch):
+    """One goal whose saved amount the round-up transfer adds to"""
+    state = {"saved": 100.0}
+
+    async def get_goals_with_totals(user_id):
+        return [{"id": "g1", "current_amount": state["saved"]}], 1000.0, state["saved"]
+
+    async def transfer_roundups(user_id, goal_id):
+        state["saved"] += 12.5
+        return 12.5
+
+    monkeypatch.setattr(main.db, "get_goals_with_totals", get_goals_with_totals)
+    monkeypatch.setattr(main.db, "transfer_roundups", transfer_roundups)
+    monkeypatch.setattr(response_cache, "redis_client", None)
+    return state
+
+
+@pytest.mark.asyncio
+async def test_roundup_transfer_refreshes_cached_goals(goals):
+    before = await main.get_goals(user_id="u1")
+    assert b'"total_saved":100.0' in before.body
+
+    await main.transfer_roundups(main.TransferRoundUpsRequest(goal_id="g1"), user_id="u1")
+
+    after = await main.get_goals(user_id="u1")
+    assert b'"total_saved":112.5' in after.body
+
+
+@pytest.mark.asyncio
+async def test_bank_link_refreshes_cached_balance(monkeypatch):
+    monkeypatch.setattr(response_cache, "redis_client", None)
+    balance = {"visible_balance": 50.0}
+
+    async def get_balance_summary(user_id):
+        return dict(balance)
+
+    async def exchange_public_token(user_id, public_token):
+        balance["visible_balance"] = 450.0
+        return {"item_id": "item"}
+
+    monkeypatch.setattr(main.ShadowBankingService, "get_balance_summary", get_balance_summary)
+    monkeypatch.setattr(main.PlaidService, "exchange_public_token", exchange_public_token)
+
+    assert b"50.0" in (await main.get_balance(user_id="u2")).body
+    await main.exchange_plaid_token(main.PlaidExchangeRequest(public_token="public"), user_id="u2")
+    assert b"450.0" in (await main.get_balance(user_id="u2")).body
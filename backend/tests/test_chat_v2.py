@@ -0,0 +1,54 @@
+import pytest
+
+from services import chat_v2
+from services.chat_v2 import ChatServiceV2
+from services.gemini_service import ModelIntent
+from services.model_router import ModelResponse
+
+
+@pytest.fixture
+def conversation(monkeypatch):
+    """A stored conversation the model router reads and chat appends to"""
+    saved = []
+
+    async def get_recent_messages(user_id, limit=50):
+        return [{"role": role, "content": content} for role, content in saved[-limit:]]
+
+    async def save_messages(user_id, messages):
+        saved.extend(messages)
+
+    async def route(user_id, message, profile, dynamic_data, life_context, conversation_history):
+        return ModelResponse(
+            content=f"seen {len(conversation_history)}", model="grok", intent=ModelIntent.ROAST,
+            input_tokens=10, output_tokens=5, cached_tokens=0, cost=0.0, latency_ms=1
+        )
+
+    async def log_routing(**kwargs):
+        pass
+
+    monkeypatch.setattr(chat_v2.db, "get_recent_messages", get_recent_messages)
+    monkeypatch.setattr(chat_v2.db, "save_messages", save_messages)
+    monkeypatch.setattr(chat_v2.model_router, "route", route)
+    monkeypatch.setattr(ChatServiceV2, "_log_routing", staticmethod(log_routing))
+    return saved
+
+
+@pytest.mark.asyncio
+async def test_exchange_is_saved_before_the_reply_returns(conversation):
+    first = await ChatServiceV2.chat("u1", "I bought a $7 latte")
+
+    assert conversation == [("user", "I bought a $7 latte"), ("assistant", first["message"])]
+
+    second = await ChatServiceV2.chat("u1", "and another")
+    assert second["message"] == "seen 2"
+
+
+@pytest.mark.asyncio
+async def test_commands_are_left_to_the_caller(conversation, monkeypatch):
+    async def handle_command(user_id, message):
+        raise AssertionError("chat() should not re-check commands")
+
+    monkeypatch.setattr(ChatServiceV2, "handle_command", staticmethod(handle_command))
+
+    response = await ChatServiceV2.chat("u1", "set intensity mode mild")
+    assert response["model"] == "grok"
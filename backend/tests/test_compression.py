@@ -0,0 +1,94 @@
+import asyncio
+import gzip
+
+import orjson
+import pytest
+from starlette.responses import Response, StreamingResponse
+
+from compression import BufferedGZipMiddleware
+
+
+async def _call(app, accept_encoding: str = "gzip"):
+    """Run one GET through the middleware, returning (start message, body messages)"""
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(b"accept-encoding", accept_encoding.encode())],
+    }
+    messages = []
+
+    async def receive():
+        # No disconnect: a streaming response's listener just waits
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+
+    await BufferedGZipMiddleware(app, minimum_size=1024, compresslevel=5)(scope, receive, send)
+    return messages[0], messages[1:]
+
+
+def _headers(start) -> dict:
+    return {name.decode(): value.decode() for name, value in start["headers"]}
+
+
+@pytest.mark.asyncio
+async def test_large_json_is_compressed():
+    body = orjson.dumps([{"merchant": "Starbucks", "amount": 4.5}] * 200)
+    start, bodies = await _call(Response(body, media_type="application/json"))
+
+    assert _headers(start)["content-encoding"] == "gzip"
+    assert gzip.decompress(b"".join(m["body"] for m in bodies)) == body
+
+
+@pytest.mark.asyncio
+async def test_small_json_is_not_compressed():
+    start, bodies = await _call(Response(b'{"ok":true}', media_type="application/json"))
+
+    assert "content-encoding" not in _headers(start)
+    assert bodies[0]["body"] == b'{"ok":true}'
+
+
+@pytest.mark.asyncio
+async def test_ndjson_stream_is_not_compressed():
+    lines = [orjson.dumps({"delta": "x" * 600}) + b"\n" for _ in range(4)]
+
+    async def stream():
+        for line in lines:
+            yield line
+
+    start, bodies = await _call(StreamingResponse(stream(), media_type="application/x-ndjson"))
+
+    assert "content-encoding" not in _headers(start)
+    assert [m["body"] for m in bodies if m["body"]] == lines
+
+
+@pytest.mark.asyncio
+async def test_first_ndjson_line_arrives_before_stream_finishes():
+    # Shaped like the legacy chat stream: a delta, then the rest only once
+    # the client has seen it (never, if the middleware holds it back)
+    first_line_seen = asyncio.Event()
+
+    async def stream():
+        yield orjson.dumps({"delta": "Whoa"}) + b"\n"
+        await asyncio.wait_for(first_line_seen.wait(), timeout=1)
+        yield orjson.dumps({"message": "Whoa, $47 on Uber?", "tokens_used": None}) + b"\n"
+
+    app = StreamingResponse(stream(), media_type="application/x-ndjson")
+    scope = {"type": "http", "method": "POST", "path": "/api/v1/chat", "headers": [(b"accept-encoding", b"gzip")]}
+    received = []
+
+    async def receive():
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            received.append(message["body"])
+            if b"\n" in message["body"]:
+                first_line_seen.set()
+
+    await BufferedGZipMiddleware(app, minimum_size=1024, compresslevel=5)(scope, receive, send)
+
+    assert orjson.loads(received[0]) == {"delta": "Whoa"}
+    assert orjson.loads(received[1])["message"] == "Whoa, $47 on Uber?"
@@ -0,0 +1,61 @@
+import json
+
+import httpx
+import pytest
+
+from services import plaid_service
+from services.plaid_service import PlaidAPIError, PlaidService, _plaid_post
+
+
+def _accounts(balance):
+    return {"accounts": [{"type": "depository", "balances": {"current": balance}}]}
+
+
+@pytest.fixture
+def plaid(monkeypatch):
+    """Route Plaid calls to a handler keyed by access token"""
+    responses = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        token = json.loads(request.content).get("access_token")
+        return responses[token]
+
+    client = httpx.AsyncClient(base_url="https://sandbox.plaid.com", transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(plaid_service, "_http_client", client)
+    return responses
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("response", [
+    httpx.Response(502, text="<html><body>Bad Gateway</body></html>"),
+    httpx.Response(503, content=b""),
+    httpx.Response(200, text="<html>maintenance</html>"),
+])
+async def test_non_json_bodies_raise_plaid_api_error(plaid, response):
+    plaid["tok"] = response
+
+    with pytest.raises(PlaidAPIError):
+        await _plaid_post("/accounts/get", {"access_token": "tok"})
+
+
+@pytest.mark.asyncio
+async def test_plaid_error_body_is_reported(plaid):
+    plaid["tok"] = httpx.Response(400, json={"error_code": "ITEM_LOGIN_REQUIRED", "error_message": "login again"})
+
+    with pytest.raises(PlaidAPIError, match="ITEM_LOGIN_REQUIRED: login again"):
+        await _plaid_post("/accounts/get", {"access_token": "tok"})
+
+
+@pytest.mark.asyncio
+async def test_one_bad_bank_does_not_break_the_total(plaid, monkeypatch):
+    async def get_plaid_items(user_id):
+        return [
+            {"plaid_item_id": "good", "plaid_access_token": "good"},
+            {"plaid_item_id": "down", "plaid_access_token": "down"},
+        ]
+
+    monkeypatch.setattr(plaid_service.db, "get_plaid_items", get_plaid_items)
+    plaid["good"] = httpx.Response(200, json=_accounts(120.5))
+    plaid["down"] = httpx.Response(502, text="<html>Bad Gateway</html>")
+
+    assert await PlaidService.get_total_balance("u1") == 120.5
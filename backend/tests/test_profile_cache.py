@@ -0,0 +1,57 @@
+import pytest
+
+import database
+from database import Database
+
+
+@pytest.fixture
+def workers(monkeypatch, fake_redis):
+    """Two per-process caches over one shared Redis and one profile row"""
+    monkeypatch.setattr(database, "get_redis", lambda: fake_redis)
+    row = {"user_id": "u1", "name": "Sam", "learned_insights": ["orders DoorDash on Fridays"]}
+    loads = []
+
+    async def get_user_profile(self, user_id):
+        loads.append(user_id)
+        return {**row, "learned_insights": list(row["learned_insights"])}
+
+    async def update_user_profile(self, user_id, updates):
+        row.update(updates)
+        return True
+
+    monkeypatch.setattr(Database, "get_user_profile", get_user_profile)
+    monkeypatch.setattr(Database, "_update_user_profile", update_user_profile)
+    return Database(), Database(), loads
+
+
+@pytest.mark.asyncio
+async def test_profile_is_served_from_cache(workers):
+    worker, _, loads = workers
+
+    await worker.get_user_profile_cached("u1")
+    await worker.get_user_profile_cached("u1")
+
+    assert loads == ["u1"]
+
+
+@pytest.mark.asyncio
+async def test_update_in_one_worker_invalidates_the_others(workers):
+    worker_a, worker_b, _ = workers
+    assert (await worker_a.get_user_profile_cached("u1"))["name"] == "Sam"
+
+    await worker_b.update_user_profile("u1", {"name": "Samantha"})
+
+    assert (await worker_a.get_user_profile_cached("u1"))["name"] == "Samantha"
+
+
+@pytest.mark.asyncio
+async def test_callers_get_their_own_copy(workers):
+    worker, _, _ = workers
+
+    profile = await worker.get_user_profile_cached("u1")
+    profile["name"] = "changed"
+    profile["learned_insights"].append("changed")
+
+    cached = await worker.get_user_profile_cached("u1")
+    assert cached["name"] == "Sam"
+    assert cached["learned_insights"] == ["orders DoorDash on Fridays"]
@@ -0,0 +1,22 @@
+import os
+
+import pydantic
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from main import SpendingLimitRequest  # noqa: E402
+
+
+def test_unknown_fields_are_dropped():
+    request = SpendingLimitRequest(category="food", amount=200, client_version="2.1")
+
+    assert request.amount == 200
+    assert not hasattr(request, "client_version")
+
+
+def test_request_models_are_frozen():
+    request = SpendingLimitRequest(category="food", amount=200)
+
+    with pytest.raises(pydantic.ValidationError):
+        request.amount = 300
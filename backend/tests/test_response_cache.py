@@ -0,0 +1,52 @@
+import pytest
+
+from services.response_cache import ResponseCache, INVALIDATE_GROUPS_LUA
+
+
+@pytest.fixture(params=["redis", "memory"])
+def cache(request, fake_redis):
+    cache = ResponseCache()
+    if request.param == "redis":
+        cache.redis_client = fake_redis
+        cache._invalidate_script = fake_redis.register_script(INVALIDATE_GROUPS_LUA)
+    return cache
+
+
+@pytest.mark.asyncio
+async def test_invalidate_drops_only_the_given_groups(cache):
+    goals = cache.key("u1", "goals", "get_goals", "")
+    bills = cache.key("u1", "bills", "get_bills", "")
+    other_user = cache.key("u2", "goals", "get_goals", "")
+    for key in (goals, bills, other_user):
+        await cache.set(key, b"[]", 30)
+
+    await cache.invalidate("u1", "goals", "forecast")
+
+    assert await cache.get(goals) is None
+    assert await cache.get(bills) == b"[]"
+    assert await cache.get(other_user) == b"[]"
+
+
+@pytest.mark.asyncio
+async def test_invalidate_drops_every_variant_of_an_endpoint(cache):
+    keys = [cache.key("u1", "bills", "get_upcoming_bills", f"days={days}") for days in (7, 30, 90)]
+    for key in keys:
+        await cache.set(key, b"{}", 30)
+
+    await cache.invalidate("u1", "bills")
+
+    assert [await cache.get(key) for key in keys] == [None, None, None]
+
+
+@pytest.mark.asyncio
+async def test_redis_invalidation_uses_the_group_index(fake_redis):
+    cache = ResponseCache()
+    cache.redis_client = fake_redis
+    cache._invalidate_script = fake_redis.register_script(INVALIDATE_GROUPS_LUA)
+    await cache.set(cache.key("u1", "goals", "get_goals", ""), b"[]", 30)
+
+    assert await fake_redis.smembers("resp:idx:u1:goals") == {b"resp:u1:goals:get_goals?"}
+
+    await cache.invalidate("u1", "goals")
+
+    assert await fake_redis.keys("resp:*") == []
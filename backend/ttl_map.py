@@ -0,0 +1,50 @@
+"""
+Size-capped TTL map for FURG
+Short-lived per-process caches (profiles, responses, re-asked answers)
+"""
+
+import time
+from typing import Any, Dict, Hashable, Iterator, Tuple
+
+
+class TTLMap:
+    """
+    Dict whose entries expire a per-entry TTL after they are set
+
+    Holds at most max_entries; when full, expired entries are dropped, or
+    the oldest one if none have expired. No awaits, so every operation is
+    atomic with respect to other requests on the event loop.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, Tuple[Any, float]] = {}  # key -> (value, expiry)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """The value for key, or default if it is missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        if entry[1] <= time.monotonic():
+            del self._entries[key]
+            return default
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any, ttl: float):
+        """Store value for ttl seconds"""
+        now = time.monotonic()
+        if key not in self._entries and len(self._entries) >= self.max_entries:
+            expired = [k for k, (_, expiry) in self._entries.items() if expiry <= now]
+            for k in expired or [next(iter(self._entries))]:
+                del self._entries[k]
+        self._entries[key] = (value, now + ttl)
+
+    def pop(self, key: Hashable):
+        """Forget key, if present"""
+        self._entries.pop(key, None)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,12 @@
+"""
+Gunicorn worker class for FURG
+UvicornWorker pinned to uvloop and httptools (both ship with uvicorn[standard])
+"""
+
+from uvicorn.workers import UvicornWorker
+
+
+class FurgUvicornWorker(UvicornWorker):
+    """Fail at boot instead of silently falling back to asyncio/h11"""
+
+    CONFIG_KWARGS = {"loop": "uvloop", "http": "httptools"}